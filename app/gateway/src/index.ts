@@ -87,6 +87,17 @@ fastify.get('/discover', async () => ({
   token: token
 }));
 
+// Token only, for kiosks revalidating a known server; the ETag lets them get a bodiless 304
+const tokenEtag = `"${token}"`;
+
+fastify.get('/discover/token', async (request, reply) => {
+  reply.header('ETag', tokenEtag);
+  if (request.headers['if-none-match'] === tokenEtag) {
+    return reply.status(304).send();
+  }
+  return reply.type('text/plain').send(token);
+});
+
 // Serve configuration panel
 fastify.get("/config-panel", async (_request, reply) => {
   const { readFileSync } = await import("fs");
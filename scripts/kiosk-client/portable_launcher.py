@@ -5,36 +5,102 @@ Portable Kiosk Launcher - Simple touchscreen kiosk setup and launcher.
 
 import json
 import os
+import shutil
 import signal
 import subprocess
-import sys
 import threading
 import time
 import socket
+import struct
+import functools
+import gzip
 import html
+import ipaddress
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import quote, unquote_plus, urlparse
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
 
 # Configuration
 CONFIG_DIR = "/var/lib/portable-kiosk"
 CONFIG_PATH = os.path.join(CONFIG_DIR, "config.json")
+SETUP_HOST = "127.0.0.1"  # Only the local Chromium talks to us
 SETUP_PORT = 8080
+INPUT_DEVICES_PATH = "/proc/bus/input/devices"
+HTTP_WORKERS = 6  # Chromium keeps at most 6 connections per host
+HTTP_IDLE_TIMEOUT = 5  # Seconds an idle keep-alive connection may hold a worker
+MAX_FORM_BYTES = 16 * 1024  # Wizard forms only carry a URL
+DEVTOOLS_PORT = 9222
+CHROMIUM_PATH = shutil.which("chromium") or shutil.which("chromium-browser") or "chromium"
+
+# Server polling
+ONLINE_POLL_INTERVAL = 30.0
+OFFLINE_BACKOFF_START = 1.0
+OFFLINE_BACKOFF_FACTOR = 1.7
+OFFLINE_BACKOFF_MAX = 30.0
 
 # Default suggestion
 DEFAULT_SUGGESTION = "http://192.168.1.15:3002/?zone=mens"
+DEFAULT_SUGGESTION_ESCAPED = html.escape(DEFAULT_SUGGESTION)
+
+# Reachability probe cache: (host, port) -> (timestamp, result)
+PROBE_CACHE_TTL = 2.0
+PROBE_CACHE_MAX_AGE = 10.0
+LAN_PROBE_TIMEOUT = 0.5
+WAN_PROBE_TIMEOUT = 3.0
+PROBE_TIMEOUT_FLOOR = 0.3
+PROBE_RTT_MULTIPLIER = 8
+BROWSER_WATCH_INTERVAL = 5.0  # Seconds between Chromium liveness checks during setup
+LIVENESS_PROBE_TIMEOUT = 3.0  # Main loop's online check; survives one lost SYN (resent after 1 s)
+DNS_CACHE_TTL = 60.0
+_probe_cache = {}
+_probe_cache_lock = threading.Lock()
+# Last successful connect time per address, used to tighten the timeout
+_connect_rtt = {}
+
+# Resolved hostnames: (host, port) -> (timestamp, address)
+_dns_cache = {}
+_dns_cache_lock = threading.Lock()
+
+# Set by signal_handler so waits in the main loop end promptly
+_stop_event = threading.Event()
+
+# Parsed config cache: (mtime_ns, config)
+_config_cache = None
 
 def load_config():
+    global _config_cache
+    try:
+        mtime_ns = os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return {}
+    if _config_cache and _config_cache[0] == mtime_ns:
+        return dict(_config_cache[1])
     try:
-        with open(CONFIG_PATH, "r") as f:
-            return json.load(f)
-    except:
+        with open(CONFIG_PATH, "rb") as f:
+            config = json.loads(f.read())
+    except (OSError, ValueError):
         return {}
+    _config_cache = (mtime_ns, config)
+    return dict(config)
 
 def save_config(config):
     os.makedirs(CONFIG_DIR, exist_ok=True)
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(config, f, indent=2)
+    # Serialize once, write once, then atomically swap the file in so a power
+    # cut never leaves a truncated config behind
+    data = json.dumps(config, indent=2).encode()
+    tmp_path = CONFIG_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CONFIG_PATH)
 
 def get_display_env():
     env = os.environ.copy()
@@ -42,15 +108,55 @@ def get_display_env():
     env["XAUTHORITY"] = f"/home/pi/.Xauthority"
     return env
 
+# Chromium started by launch_browser, reused across URL changes, and the URL it shows
+_browser_proc = None
+_browser_url = None
+
 def kill_browser():
-    subprocess.run(["pkill", "-f", "chromium"], capture_output=True)
-    time.sleep(1)
+    global _browser_proc, _browser_url
+    if _browser_proc and _browser_proc.poll() is None:
+        _browser_proc.terminate()
+        try:
+            _browser_proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            _browser_proc.kill()
+            _browser_proc.wait()
+    # wait() returns as soon as the old browser has exited; no fixed sleep
+    _browser_proc = None
+    _browser_url = None
+
+def _devtools_request(path, method="GET"):
+    req = urllib.request.Request(f"http://127.0.0.1:{DEVTOOLS_PORT}{path}", method=method)
+    with urllib.request.urlopen(req, timeout=2) as resp:
+        return resp.read()
+
+def navigate_browser(url):
+    """Open url in the running Chromium via DevTools. Returns False if there is no usable browser."""
+    if _browser_proc is None or _browser_proc.poll() is not None:
+        return False
+    try:
+        targets = json.loads(_devtools_request("/json/list"))
+        old_pages = [t["id"] for t in targets if t.get("type") == "page"]
+        _devtools_request("/json/new?" + quote(url, safe=""), method="PUT")
+        for page_id in old_pages:
+            _devtools_request(f"/json/close/{page_id}")
+        return True
+    except (OSError, ValueError, KeyError):
+        return False
 
 def launch_browser(url):
+    global _browser_proc, _browser_url
+    # Already showing url: leave the page alone so polls don't reload the kiosk UI
+    if url == _browser_url and _browser_proc is not None and _browser_proc.poll() is None:
+        return
+    # Reuse the running browser; a cold Chromium start takes seconds on the Pi
+    if navigate_browser(url):
+        _browser_url = url
+        return
     kill_browser()
     env = get_display_env()
     cmd = [
-        "chromium",
+        CHROMIUM_PATH,
         "--kiosk",
         "--no-sandbox",
         "--disable-infobars",
@@ -60,24 +166,113 @@ def launch_browser(url):
         "--start-fullscreen",
         "--touch-events=enabled",
         "--disable-translate",
-        "--disable-features=TranslateUI",
+        # Only the last --disable-features switch is honoured, so keep one list
+        "--disable-features=TranslateUI,site-per-process,IsolateOrigins",
+        # Run as a single process to save RAM on the Pi. Chromium calls this
+        # mode less stable; acceptable here because the kiosk shows one page
+        # and every mode (online, offline, setup) calls launch_browser again
+        # periodically, which respawns the process once it has exited.
+        "--single-process",
+        "--no-zygote",
+        "--process-per-site",
+        "--renderer-process-limit=1",
+        "--disable-gpu",
+        "--disable-dev-shm-usage",
+        f"--remote-debugging-port={DEVTOOLS_PORT}",
         url
     ]
-    subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # close_fds=False with an absolute executable lets CPython use posix_spawn
+    # instead of fork+exec. Our own descriptors are non-inheritable (PEP 446).
+    _browser_proc = subprocess.Popen(
+        cmd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=False
+    )
+    _browser_url = url
+
+def _probe_timeout(address):
+    """LAN hosts answer in milliseconds, so a silent drop is detected much sooner."""
+    timeout = WAN_PROBE_TIMEOUT
+    try:
+        if ipaddress.ip_address(address[0]).is_private:
+            timeout = LAN_PROBE_TIMEOUT
+    except ValueError:
+        pass
+    # Once we have seen how fast this server answers, don't wait much longer
+    rtt = _connect_rtt.get(address)
+    if rtt is not None:
+        timeout = min(timeout, max(PROBE_TIMEOUT_FLOOR, rtt * PROBE_RTT_MULTIPLIER))
+    return timeout
+
+@functools.lru_cache(maxsize=32)
+def _parse_endpoint(url):
+    """Return (host, port) for url, or None if it cannot be an HTTP server address."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return None
+    default_port = 443 if parsed.scheme == "https" else 80
+    return parsed.hostname, parsed.port or default_port
 
-def check_server(url):
-    """Check if server is reachable."""
+def _resolve_endpoint(host, port):
+    """Resolve host to a socket address, caching DNS answers for DNS_CACHE_TTL."""
     try:
-        parsed = urlparse(url)
-        host = parsed.hostname
-        port = parsed.port or 80
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(3)
-        result = sock.connect_ex((host, port))
-        sock.close()
-        return result == 0
-    except:
+        ipaddress.ip_address(host)
+        return (host, port)
+    except ValueError:
+        pass
+    now = time.monotonic()
+    with _dns_cache_lock:
+        cached = _dns_cache.get((host, port))
+        if cached and now - cached[0] < DNS_CACHE_TTL:
+            return cached[1]
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    address = infos[0][4][:2]
+    with _dns_cache_lock:
+        _dns_cache[(host, port)] = (now, address)
+    return address
+
+def check_server(url, use_cache=True, timeout=None):
+    """Check if server is reachable; timeout overrides the learned, RTT-based one."""
+    # Reject junk before any cache lookup, resolver call or socket
+    try:
+        endpoint = _parse_endpoint(url)
+    except ValueError:
+        return False
+    if endpoint is None:
         return False
+    host, port = endpoint
+
+    key = (host, port)
+    now = time.monotonic()
+    with _probe_cache_lock:
+        cached = _probe_cache.get(key)
+        if use_cache and cached and now - cached[0] < PROBE_CACHE_TTL:
+            return cached[1]
+
+    address = None
+    try:
+        address = _resolve_endpoint(host, port)
+        started = time.monotonic()
+        with socket.create_connection(address, timeout=timeout or _probe_timeout(address)):
+            result = True
+        rtt = time.monotonic() - started
+    except OSError:
+        result = False
+
+    now = time.monotonic()
+    with _probe_cache_lock:
+        if result:
+            _connect_rtt[address] = rtt
+        elif address is not None:
+            # Fall back to the full timeout next time in case the link got slower
+            _connect_rtt.pop(address, None)
+        # Drop stale entries so the cache stays bounded
+        for stale in [k for k, (ts, _) in _probe_cache.items() if now - ts > PROBE_CACHE_MAX_AGE]:
+            del _probe_cache[stale]
+        _probe_cache[key] = (now, result)
+    return result
 
 def auto_discover_server():
     """Try to find server on common IPs."""
@@ -87,513 +282,619 @@ def auto_discover_server():
         "192.168.1.10:3002",
         "192.168.1.1:3002",
     ]
-    for ip in common_ips:
-        url = f"http://{ip}"
-        if check_server(url):
-            return url
-    return None
-
-class OfflineScreen:
-    """Shows offline screen when server is unreachable."""
-    
-    def __init__(self, kiosk_url):
-        self.kiosk_url = kiosk_url
-        self.server = None
-        self.should_stop = False
-    
-    def start(self):
-        handler = self._create_handler()
-        self.server = ThreadingHTTPServer(("0.0.0.0", SETUP_PORT), handler)
-        self.server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
-        thread.start()
-        launch_browser(f"http://localhost:{SETUP_PORT}/offline")
-    
-    def stop(self):
-        self.should_stop = True
-        if self.server:
-            self.server.shutdown()
-    
-    def _create_handler(self):
-        screen = self
-        
-        class Handler(BaseHTTPRequestHandler):
-            def log_message(self, format, *args):
-                pass
-            
-            def do_GET(self):
-                self.send_response(200)
-                self.send_header("Content-Type", "text/html; charset=utf-8")
-                self.end_headers()
-                
-                server_addr = screen.kiosk_url
-                
-                html_content = f"""
-                <!DOCTYPE html>
-                <html lang="tr">
-                <head>
-                    <meta charset="utf-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1">
-                    <meta http-equiv="refresh" content="10">
-                    <title>Çevrimdışı</title>
-                    <style>
-                        * {{ box-sizing: border-box; margin: 0; padding: 0; }}
-                        body {{
-                            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-                            background: linear-gradient(135deg, #1a202c 0%, #2d3748 100%);
-                            min-height: 100vh;
-                            display: flex;
-                            align-items: center;
-                            justify-content: center;
-                            padding: 20px;
-                            color: white;
-                        }}
-                        .card {{
-                            background: rgba(255,255,255,0.1);
-                            border-radius: 24px;
-                            padding: 50px;
-                            max-width: 500px;
-                            width: 100%;
-                            text-align: center;
-                            backdrop-filter: blur(10px);
-                        }}
-                        .icon {{ font-size: 80px; margin-bottom: 30px; }}
-                        h1 {{ font-size: 32px; margin-bottom: 15px; }}
-                        p {{ color: #a0aec0; font-size: 18px; line-height: 1.6; margin-bottom: 20px; }}
-                        .server {{ 
-                            background: rgba(0,0,0,0.3); 
-                            padding: 15px; 
-                            border-radius: 12px; 
-                            font-family: monospace;
-                            margin: 20px 0;
-                            color: #fc8181;
-                        }}
-                        .spinner {{
-                            width: 40px;
-                            height: 40px;
-                            border: 3px solid rgba(255,255,255,0.2);
-                            border-top-color: #68d391;
-                            border-radius: 50%;
-                            animation: spin 1s linear infinite;
-                            margin: 20px auto;
-                        }}
-                        @keyframes spin {{ to {{ transform: rotate(360deg); }} }}
-                        .status {{ color: #68d391; font-size: 16px; }}
-                    </style>
-                </head>
-                <body>
-                    <div class="card">
-                        <div class="icon">📡</div>
-                        <h1>Sunucu Çevrimdışı</h1>
-                        <p>Kiosk sunucusuna bağlanılamıyor.</p>
-                        <div class="server">{html.escape(server_addr)}</div>
-                        <div class="spinner"></div>
-                        <p class="status">Yeniden bağlanmaya çalışılıyor...</p>
-                        <p style="font-size: 14px; color: #718096;">Sayfa her 10 saniyede otomatik yenilenir</p>
-                    </div>
-                </body>
-                </html>
-                """
-                self.wfile.write(html_content.encode())
-        
-        return Handler
+    # Probe all candidates at once; total wait is the slowest single probe
+    executor = ThreadPoolExecutor(max_workers=len(common_ips))
+    try:
+        futures = {
+            executor.submit(check_server, f"http://{ip}"): f"http://{ip}"
+            for ip in common_ips
+        }
+        for future in as_completed(futures):
+            if future.result():
+                return futures[future]
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Page templates. Markers in braces are substituted with str.replace, never
+# str.format, so the CSS braces stay literal.
+OFFLINE_PAGE_TEMPLATE = """\
+<!DOCTYPE html>
+<html lang="tr">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <meta http-equiv="refresh" content="10">
+    <title>Çevrimdışı</title>
+    <style>
+        * { box-sizing: border-box; margin: 0; padding: 0; }
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
+            background: linear-gradient(135deg, #1a202c 0%, #2d3748 100%);
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 20px;
+            color: white;
+        }
+        .card {
+            background: rgba(255,255,255,0.1);
+            border-radius: 24px;
+            padding: 50px;
+            max-width: 500px;
+            width: 100%;
+            text-align: center;
+            backdrop-filter: blur(10px);
+        }
+        .icon { font-size: 80px; margin-bottom: 30px; }
+        h1 { font-size: 32px; margin-bottom: 15px; }
+        p { color: #a0aec0; font-size: 18px; line-height: 1.6; margin-bottom: 20px; }
+        .server { 
+            background: rgba(0,0,0,0.3); 
+            padding: 15px; 
+            border-radius: 12px; 
+            font-family: monospace;
+            margin: 20px 0;
+            color: #fc8181;
+        }
+        .spinner {
+            width: 40px;
+            height: 40px;
+            border: 3px solid rgba(255,255,255,0.2);
+            border-top-color: #68d391;
+            border-radius: 50%;
+            animation: spin 1s linear infinite;
+            margin: 20px auto;
+        }
+        @keyframes spin { to { transform: rotate(360deg); } }
+        .status { color: #68d391; font-size: 16px; }
+    </style>
+</head>
+<body>
+    <div class="card">
+        <div class="icon">📡</div>
+        <h1>Sunucu Çevrimdışı</h1>
+        <p>Kiosk sunucusuna bağlanılamıyor.</p>
+        <div class="server">{server_addr}</div>
+        <div class="spinner"></div>
+        <p class="status">Yeniden bağlanmaya çalışılıyor...</p>
+        <p style="font-size: 14px; color: #718096;">Sayfa her 10 saniyede otomatik yenilenir</p>
+    </div>
+</body>
+</html>
+"""
+
+WIZARD_STYLE = """\
+<style>
+    * { box-sizing: border-box; margin: 0; padding: 0; }
+    body {
+        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
+        background: linear-gradient(135deg, #1a365d 0%, #2d5a87 100%);
+        min-height: 100vh;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        padding: 20px;
+    }
+    .card {
+        background: white;
+        border-radius: 24px;
+        padding: 40px;
+        max-width: 500px;
+        width: 100%;
+        box-shadow: 0 25px 80px rgba(0,0,0,0.3);
+        text-align: center;
+    }
+    h1 { color: #1a365d; margin-bottom: 10px; font-size: 28px; }
+    h2 { color: #2d5a87; margin-bottom: 20px; font-size: 20px; font-weight: normal; }
+    p { color: #4a5568; line-height: 1.6; margin-bottom: 20px; }
+    .btn {
+        display: inline-block;
+        padding: 16px 40px;
+        border: none;
+        border-radius: 12px;
+        font-size: 18px;
+        font-weight: 600;
+        cursor: pointer;
+        margin: 10px;
+        text-decoration: none;
+        transition: transform 0.2s, box-shadow 0.2s;
+    }
+    .btn:hover { transform: translateY(-2px); }
+    .btn-primary {
+        background: linear-gradient(135deg, #3182ce, #2c5282);
+        color: white;
+        box-shadow: 0 10px 30px rgba(49,130,206,0.4);
+    }
+    .btn-secondary {
+        background: #e2e8f0;
+        color: #2d3748;
+    }
+    .btn-success {
+        background: linear-gradient(135deg, #38a169, #276749);
+        color: white;
+        box-shadow: 0 10px 30px rgba(56,161,105,0.4);
+    }
+    input[type="text"] {
+        width: 100%;
+        padding: 16px;
+        border: 2px solid #e2e8f0;
+        border-radius: 12px;
+        font-size: 16px;
+        margin-bottom: 15px;
+    }
+    input[type="text"]:focus {
+        outline: none;
+        border-color: #3182ce;
+    }
+    .error {
+        background: #fed7d7;
+        color: #c53030;
+        padding: 12px;
+        border-radius: 8px;
+        margin-bottom: 20px;
+    }
+    .success-url {
+        background: #c6f6d5;
+        color: #276749;
+        padding: 16px;
+        border-radius: 12px;
+        margin: 20px 0;
+        word-break: break-all;
+        font-family: monospace;
+    }
+    .hint {
+        background: #ebf8ff;
+        color: #2b6cb0;
+        padding: 12px;
+        border-radius: 8px;
+        margin-top: 15px;
+        font-size: 14px;
+    }
+    .spinner {
+        width: 60px;
+        height: 60px;
+        border: 4px solid #e2e8f0;
+        border-top-color: #3182ce;
+        border-radius: 50%;
+        animation: spin 1s linear infinite;
+        margin: 20px auto;
+    }
+    @keyframes spin { to { transform: rotate(360deg); } }
+    .icon { font-size: 60px; margin-bottom: 20px; }
+</style>
+"""
+
+WIZARD_WELCOME_TEMPLATE = """\
+<!DOCTYPE html>
+<html lang="tr">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>Kiosk Kurulumu</title>
+    {style}
+</head>
+<body>
+    <div class="card">
+        <div class="icon">🖥️</div>
+        <h1>Kiosk Ekranı Kurulumu</h1>
+        <h2>Sunucu bağlantısı yapılandırması</h2>
+        <p>Kiosk ekranınızı sunucuya bağlamak için aşağıdaki seçeneklerden birini kullanın:</p>
+        <a href="/auto-search" class="btn btn-primary">🔍 Sunucuyu Otomatik Bul</a>
+        <a href="/manual" class="btn btn-secondary">✏️ Manuel Gir</a>
+    </div>
+</body>
+</html>
+"""
+
+WIZARD_SEARCHING_TEMPLATE = """\
+<!DOCTYPE html>
+<html lang="tr">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <meta http-equiv="refresh" content="3;url=/auto-search">
+    <title>Aranıyor...</title>
+    {style}
+</head>
+<body>
+    <div class="card">
+        <div class="spinner"></div>
+        <h1>Sunucu Aranıyor</h1>
+        <p>Ağda kiosk sunucusu aranıyor, lütfen bekleyin...</p>
+    </div>
+</body>
+</html>
+"""
+
+WIZARD_MANUAL_TEMPLATE = """\
+<!DOCTYPE html>
+<html lang="tr">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>Manuel Giriş</title>
+    {style}
+</head>
+<body>
+    <div class="card">
+        <div class="icon">✏️</div>
+        <h1>Manuel Sunucu Girişi</h1>
+        <p>Kiosk sunucusunun tam adresini girin:</p>
+        {error_html}
+        <form method="post" action="/manual-submit">
+            <input type="text" name="url" placeholder="http://192.168.1.15:3002/?zone=mens" 
+                   value="{kiosk_url}" autofocus>
+            <button type="submit" class="btn btn-primary">🔗 Bağlan</button>
+        </form>
+        <div class="hint">
+            💡 Öneri: <strong>{suggestion}</strong>
+            <br><br>
+            <button onclick="document.querySelector('input[name=url]').value='{suggestion}'" 
+                    class="btn btn-secondary" type="button" style="padding: 10px 20px; font-size: 14px;">
+                Öneriyi Kullan
+            </button>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+WIZARD_SUCCESS_TEMPLATE = """\
+<!DOCTYPE html>
+<html lang="tr">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>Kurulum Tamamlandı</title>
+    {style}
+</head>
+<body>
+    <div class="card">
+        <div class="icon">✅</div>
+        <h1>Bağlantı Başarılı!</h1>
+        <p>Sunucuya başarıyla bağlanıldı.</p>
+        <div class="success-url">{kiosk_url}</div>
+        <p>Kurulumu tamamlamak ve kiosk modunu başlatmak için aşağıdaki butona tıklayın.</p>
+        <form method="post" action="/finish">
+            <button type="submit" class="btn btn-success">🚀 Kurulumu Tamamla ve Başlat</button>
+        </form>
+        <div class="hint">
+            Cihaz yeniden başlatılacak ve kiosk modu otomatik olarak açılacaktır.
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+def _compile_page(template, *fields):
+    """Pre-encode a page template as byte segments split around its dynamic fields."""
+    template = template.replace("{style}", WIZARD_STYLE).replace("{suggestion}", DEFAULT_SUGGESTION_ESCAPED)
+    parts = [template]
+    for field in fields:
+        head, tail = parts.pop().split("{%s}" % field)
+        parts += [head, tail]
+    return [part.encode() for part in parts]
+
+
+def _render_page(parts, *values):
+    """Join pre-encoded page segments with the (already escaped) dynamic values."""
+    chunks = [parts[0]]
+    for value, part in zip(values, parts[1:]):
+        chunks.append(value.encode())
+        chunks.append(part)
+    return b"".join(chunks)
+
+
+def _gzip(content):
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def _prebuilt_response(body, gzipped=False):
+    """Build a complete HTTP/1.1 200 response for a page that never changes."""
+    headers = b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+    if gzipped:
+        body = _gzip(body)
+        headers += b"Content-Encoding: gzip\r\n"
+    return headers + b"Content-Length: %d\r\n\r\n" % len(body) + body
+
 
+WIZARD_WELCOME_PAGE = _render_page(_compile_page(WIZARD_WELCOME_TEMPLATE))
+WIZARD_WELCOME_PAGE_GZ = _gzip(WIZARD_WELCOME_PAGE)
+WIZARD_SEARCHING_PAGE = _render_page(_compile_page(WIZARD_SEARCHING_TEMPLATE))
+WIZARD_SEARCHING_PAGE_GZ = _gzip(WIZARD_SEARCHING_PAGE)
+WIZARD_RESTARTING_PAGE = "<html><body><h1>Yeniden başlatılıyor...</h1></body></html>".encode()
+WIZARD_RESTARTING_PAGE_GZ = _gzip(WIZARD_RESTARTING_PAGE)
+WIZARD_MANUAL_PARTS = _compile_page(WIZARD_MANUAL_TEMPLATE, "error_html", "kiosk_url")
+WIZARD_SUCCESS_PARTS = _compile_page(WIZARD_SUCCESS_TEMPLATE, "kiosk_url")
 
-class SetupWizard:
-    """Setup wizard HTTP server."""
+
+def _extract_field(body, name):
+    """Return one urlencoded form field; the wizard forms only ever post ``url``."""
+    for pair in body.split("&"):
+        key, _, value = pair.partition("=")
+        if key == name:
+            return unquote_plus(value)
+    return ""
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """HTTP server that handles requests on a bounded worker pool instead of a thread per request."""
+
+    # Rebind straight away when the launcher restarts (SO_REUSEADDR is already on)
+    allow_reuse_port = True
+
+    def __init__(self, server_address, handler_class, max_workers=HTTP_WORKERS):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LocalServer:
+    """Local HTTP server for the setup wizard and offline screen; transitions only flip ``mode``."""
     
     def __init__(self):
+        self.mode = "setup"  # setup, online or offline
+        self.target_url = ""
+        self.server = None
+        self._offline_response = b""
+        self._offline_response_gz = b""
+        # Setup wizard state
         self.step = 1  # 1=welcome, 2=searching, 3=manual, 4=success
         self.kiosk_url = ""
         self.error_message = ""
-        self.server = None
         self.result_url = None
         self.done_event = threading.Event()
     
+    @property
+    def kiosk_url(self):
+        return self._kiosk_url
+    
+    @kiosk_url.setter
+    def kiosk_url(self, url):
+        # Escape once here rather than on every page render
+        self._kiosk_url = url
+        self.kiosk_url_html = html.escape(url)
+    
     def start(self):
         handler = self._create_handler()
-        self.server = ThreadingHTTPServer(("0.0.0.0", SETUP_PORT), handler)
-        self.server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        
+        self.server = PooledHTTPServer((SETUP_HOST, SETUP_PORT), handler)
         thread = threading.Thread(target=self.server.serve_forever, daemon=True)
         thread.start()
-        
-        # Launch browser to setup page
-        time.sleep(1)
-        launch_browser(f"http://localhost:{SETUP_PORT}/")
-        
-        # Wait for setup to complete
-        self.done_event.wait()
-        self.server.shutdown()
-        
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+    
+    def show_online(self, kiosk_url):
+        self.target_url = kiosk_url
+        self.mode = "online"
+    
+    def show_offline(self, kiosk_url):
+        if kiosk_url != self.target_url or not self._offline_response:
+            # Pre-bake status line, headers and body so a refresh is one write
+            body = OFFLINE_PAGE_TEMPLATE.replace(
+                "{server_addr}", html.escape(kiosk_url)
+            ).encode()
+            self._offline_response = _prebuilt_response(body)
+            self._offline_response_gz = _prebuilt_response(body, gzipped=True)
+        self.target_url = kiosk_url
+        self.mode = "offline"
+        launch_browser(f"http://{SETUP_HOST}:{SETUP_PORT}/offline")
+    
+    def run_wizard(self):
+        """Show the setup wizard and block until it finishes; returns the chosen URL."""
+        self.mode = "setup"
+        wizard_url = f"http://{SETUP_HOST}:{SETUP_PORT}/"
+        launch_browser(wizard_url)
+        # Relaunch a crashed Chromium; a no-op while it is alive on the wizard
+        while not self.done_event.wait(BROWSER_WATCH_INTERVAL):
+            if _stop_event.is_set():
+                break
+            launch_browser(wizard_url)
         return self.result_url
     
     def _create_handler(self):
-        wizard = self
+        local = self
         
         class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so every response must carry Content-Length
+            protocol_version = "HTTP/1.1"
+            timeout = HTTP_IDLE_TIMEOUT
+            # Small wizard responses go out immediately instead of waiting on Nagle
+            disable_nagle_algorithm = True
+            
             def log_message(self, format, *args):
                 pass
             
             def do_GET(self):
-                if self.path == "/" or self.path.startswith("/step"):
+                if local.mode == "offline":
+                    if self._accepts_gzip():
+                        self.wfile.write(local._offline_response_gz)
+                    else:
+                        self.wfile.write(local._offline_response)
+                elif local.mode == "online":
+                    self._redirect(local.target_url)
+                elif self.path == "/" or self.path.startswith("/step"):
                     self._render_page()
                 elif self.path == "/auto-search":
                     self._do_auto_search()
                 elif self.path == "/manual":
-                    wizard.step = 3
-                    wizard.error_message = ""
-                    self.send_response(302)
-                    self.send_header("Location", "/")
-                    self.end_headers()
+                    local.step = 3
+                    local.error_message = ""
+                    self._redirect("/")
                 else:
-                    self.send_response(302)
-                    self.send_header("Location", "/")
-                    self.end_headers()
+                    self._redirect("/")
             
             def do_POST(self):
-                if self.path == "/manual-submit":
+                try:
+                    length = int(self.headers["Content-Length"])
+                except (TypeError, ValueError):
+                    self.send_error(HTTPStatus.LENGTH_REQUIRED)
+                    return
+                if length < 0 or length > MAX_FORM_BYTES:
+                    self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                    return
+                self.form_body = self.rfile.read(length).decode(errors="replace")
+                
+                if local.mode != "setup":
+                    self._redirect("/")
+                elif self.path == "/manual-submit":
                     self._handle_manual_submit()
                 elif self.path == "/test-url":
                     self._handle_test_url()
                 elif self.path == "/finish":
                     self._handle_finish()
                 else:
-                    self.send_response(302)
-                    self.send_header("Location", "/")
-                    self.end_headers()
+                    self._redirect("/")
+            
+            def _accepts_gzip(self):
+                return "gzip" in self.headers.get("Accept-Encoding", "")
+            
+            def _redirect(self, location):
+                self.send_response(302)
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def _send(self, content, content_type, gzipped=None):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                if self._accepts_gzip():
+                    content = gzipped if gzipped is not None else _gzip(content)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+            
+            def _send_html(self, content, gzipped=None):
+                self._send(content, "text/html; charset=utf-8", gzipped)
             
             def _do_auto_search(self):
                 """Auto search for server."""
                 found = auto_discover_server()
                 if found:
-                    wizard.kiosk_url = found + "/?zone=mens"
-                    wizard.step = 4
+                    local.kiosk_url = found + "/?zone=mens"
+                    local.step = 4
                 else:
-                    wizard.step = 3
-                    wizard.error_message = "Sunucu otomatik olarak bulunamadı. Lütfen manuel girin."
-                self.send_response(302)
-                self.send_header("Location", "/")
-                self.end_headers()
+                    local.step = 3
+                    local.error_message = "Sunucu otomatik olarak bulunamadı. Lütfen manuel girin."
+                self._redirect("/")
             
             def _handle_manual_submit(self):
-                length = int(self.headers.get("Content-Length", 0))
-                body = self.rfile.read(length).decode()
-                form = parse_qs(body)
-                url = form.get("url", [""])[0].strip()
+                url = _extract_field(self.form_body, "url").strip()
                 
                 if not url:
-                    wizard.error_message = "URL boş olamaz!"
-                    wizard.step = 3
+                    local.error_message = "URL boş olamaz!"
+                    local.step = 3
                 else:
                     # Accept manual entry without checking
-                    wizard.kiosk_url = url
-                    wizard.step = 4
-                    wizard.error_message = ""
+                    local.kiosk_url = url
+                    local.step = 4
+                    local.error_message = ""
                 
-                self.send_response(302)
-                self.send_header("Location", "/")
-                self.end_headers()
+                self._redirect("/")
             
             def _handle_test_url(self):
-                length = int(self.headers.get("Content-Length", 0))
-                body = self.rfile.read(length).decode()
-                form = parse_qs(body)
-                url = form.get("url", [""])[0].strip()
+                url = _extract_field(self.form_body, "url").strip()
                 
                 result = {"success": check_server(url) if url else False}
+                content = json.dumps(result).encode()
                 self.send_response(200)
                 self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
                 self.end_headers()
-                self.wfile.write(json.dumps(result).encode())
+                self.wfile.write(content)
             
             def _handle_finish(self):
-                if wizard.kiosk_url:
-                    save_config({"kiosk_url": wizard.kiosk_url})
-                    wizard.result_url = wizard.kiosk_url
-                    wizard.done_event.set()
+                if local.kiosk_url:
+                    save_config({"kiosk_url": local.kiosk_url})
+                    local.result_url = local.kiosk_url
+                    local.done_event.set()
                 
-                self.send_response(200)
-                self.send_header("Content-Type", "text/html; charset=utf-8")
-                self.end_headers()
-                self.wfile.write(b"<html><body><h1>Yeniden baslatiliyor...</h1></body></html>")
+                self._send_html(WIZARD_RESTARTING_PAGE, WIZARD_RESTARTING_PAGE_GZ)
 
             def _render_page(self):
-                if wizard.step == 1:
-                    content = self._page_welcome()
-                elif wizard.step == 2:
-                    content = self._page_searching()
-                elif wizard.step == 3:
-                    content = self._page_manual()
-                elif wizard.step == 4:
-                    content = self._page_success()
+                if local.step == 2:
+                    self._send_html(WIZARD_SEARCHING_PAGE, WIZARD_SEARCHING_PAGE_GZ)
+                elif local.step == 3:
+                    self._send_html(self._page_manual())
+                elif local.step == 4:
+                    self._send_html(self._page_success())
                 else:
-                    content = self._page_welcome()
-                
-                self.send_response(200)
-                self.send_header("Content-Type", "text/html; charset=utf-8")
-                self.end_headers()
-                self.wfile.write(content.encode())
-            
-            def _base_style(self):
-                return """
-                <style>
-                    * { box-sizing: border-box; margin: 0; padding: 0; }
-                    body {
-                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-                        background: linear-gradient(135deg, #1a365d 0%, #2d5a87 100%);
-                        min-height: 100vh;
-                        display: flex;
-                        align-items: center;
-                        justify-content: center;
-                        padding: 20px;
-                    }
-                    .card {
-                        background: white;
-                        border-radius: 24px;
-                        padding: 40px;
-                        max-width: 500px;
-                        width: 100%;
-                        box-shadow: 0 25px 80px rgba(0,0,0,0.3);
-                        text-align: center;
-                    }
-                    h1 { color: #1a365d; margin-bottom: 10px; font-size: 28px; }
-                    h2 { color: #2d5a87; margin-bottom: 20px; font-size: 20px; font-weight: normal; }
-                    p { color: #4a5568; line-height: 1.6; margin-bottom: 20px; }
-                    .btn {
-                        display: inline-block;
-                        padding: 16px 40px;
-                        border: none;
-                        border-radius: 12px;
-                        font-size: 18px;
-                        font-weight: 600;
-                        cursor: pointer;
-                        margin: 10px;
-                        text-decoration: none;
-                        transition: transform 0.2s, box-shadow 0.2s;
-                    }
-                    .btn:hover { transform: translateY(-2px); }
-                    .btn-primary {
-                        background: linear-gradient(135deg, #3182ce, #2c5282);
-                        color: white;
-                        box-shadow: 0 10px 30px rgba(49,130,206,0.4);
-                    }
-                    .btn-secondary {
-                        background: #e2e8f0;
-                        color: #2d3748;
-                    }
-                    .btn-success {
-                        background: linear-gradient(135deg, #38a169, #276749);
-                        color: white;
-                        box-shadow: 0 10px 30px rgba(56,161,105,0.4);
-                    }
-                    input[type="text"] {
-                        width: 100%;
-                        padding: 16px;
-                        border: 2px solid #e2e8f0;
-                        border-radius: 12px;
-                        font-size: 16px;
-                        margin-bottom: 15px;
-                    }
-                    input[type="text"]:focus {
-                        outline: none;
-                        border-color: #3182ce;
-                    }
-                    .error {
-                        background: #fed7d7;
-                        color: #c53030;
-                        padding: 12px;
-                        border-radius: 8px;
-                        margin-bottom: 20px;
-                    }
-                    .success-url {
-                        background: #c6f6d5;
-                        color: #276749;
-                        padding: 16px;
-                        border-radius: 12px;
-                        margin: 20px 0;
-                        word-break: break-all;
-                        font-family: monospace;
-                    }
-                    .hint {
-                        background: #ebf8ff;
-                        color: #2b6cb0;
-                        padding: 12px;
-                        border-radius: 8px;
-                        margin-top: 15px;
-                        font-size: 14px;
-                    }
-                    .spinner {
-                        width: 60px;
-                        height: 60px;
-                        border: 4px solid #e2e8f0;
-                        border-top-color: #3182ce;
-                        border-radius: 50%;
-                        animation: spin 1s linear infinite;
-                        margin: 20px auto;
-                    }
-                    @keyframes spin { to { transform: rotate(360deg); } }
-                    .icon { font-size: 60px; margin-bottom: 20px; }
-                </style>
-                """
-
-            def _page_welcome(self):
-                return f"""
-                <!DOCTYPE html>
-                <html lang="tr">
-                <head>
-                    <meta charset="utf-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1">
-                    <title>Kiosk Kurulumu</title>
-                    {self._base_style()}
-                </head>
-                <body>
-                    <div class="card">
-                        <div class="icon">🖥️</div>
-                        <h1>Kiosk Ekranı Kurulumu</h1>
-                        <h2>Sunucu bağlantısı yapılandırması</h2>
-                        <p>Kiosk ekranınızı sunucuya bağlamak için aşağıdaki seçeneklerden birini kullanın:</p>
-                        <a href="/auto-search" class="btn btn-primary">🔍 Sunucuyu Otomatik Bul</a>
-                        <a href="/manual" class="btn btn-secondary">✏️ Manuel Gir</a>
-                    </div>
-                </body>
-                </html>
-                """
-            
-            def _page_searching(self):
-                return f"""
-                <!DOCTYPE html>
-                <html lang="tr">
-                <head>
-                    <meta charset="utf-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1">
-                    <meta http-equiv="refresh" content="3;url=/auto-search">
-                    <title>Aranıyor...</title>
-                    {self._base_style()}
-                </head>
-                <body>
-                    <div class="card">
-                        <div class="spinner"></div>
-                        <h1>Sunucu Aranıyor</h1>
-                        <p>Ağda kiosk sunucusu aranıyor, lütfen bekleyin...</p>
-                    </div>
-                </body>
-                </html>
-                """
+                    self._send_html(WIZARD_WELCOME_PAGE, WIZARD_WELCOME_PAGE_GZ)
             
             def _page_manual(self):
                 error_html = ""
-                if wizard.error_message:
-                    error_html = f'<div class="error">{html.escape(wizard.error_message)}</div>'
-                
-                return f"""
-                <!DOCTYPE html>
-                <html lang="tr">
-                <head>
-                    <meta charset="utf-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1">
-                    <title>Manuel Giriş</title>
-                    {self._base_style()}
-                </head>
-                <body>
-                    <div class="card">
-                        <div class="icon">✏️</div>
-                        <h1>Manuel Sunucu Girişi</h1>
-                        <p>Kiosk sunucusunun tam adresini girin:</p>
-                        {error_html}
-                        <form method="post" action="/manual-submit">
-                            <input type="text" name="url" placeholder="http://192.168.1.15:3002/?zone=mens" 
-                                   value="{html.escape(wizard.kiosk_url or '')}" autofocus>
-                            <button type="submit" class="btn btn-primary">🔗 Bağlan</button>
-                        </form>
-                        <div class="hint">
-                            💡 Öneri: <strong>{DEFAULT_SUGGESTION}</strong>
-                            <br><br>
-                            <button onclick="document.querySelector('input[name=url]').value='{DEFAULT_SUGGESTION}'" 
-                                    class="btn btn-secondary" type="button" style="padding: 10px 20px; font-size: 14px;">
-                                Öneriyi Kullan
-                            </button>
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
+                if local.error_message:
+                    error_html = f'<div class="error">{html.escape(local.error_message)}</div>'
+                return _render_page(WIZARD_MANUAL_PARTS, error_html, local.kiosk_url_html)
 
             def _page_success(self):
-                return f"""
-                <!DOCTYPE html>
-                <html lang="tr">
-                <head>
-                    <meta charset="utf-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1">
-                    <title>Kurulum Tamamlandı</title>
-                    {self._base_style()}
-                </head>
-                <body>
-                    <div class="card">
-                        <div class="icon">✅</div>
-                        <h1>Bağlantı Başarılı!</h1>
-                        <p>Sunucuya başarıyla bağlanıldı.</p>
-                        <div class="success-url">{html.escape(wizard.kiosk_url)}</div>
-                        <p>Kurulumu tamamlamak ve kiosk modunu başlatmak için aşağıdaki butona tıklayın.</p>
-                        <form method="post" action="/finish">
-                            <button type="submit" class="btn btn-success">🚀 Kurulumu Tamamla ve Başlat</button>
-                        </form>
-                        <div class="hint">
-                            Cihaz yeniden başlatılacak ve kiosk modu otomatik olarak açılacaktır.
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
+                return _render_page(WIZARD_SUCCESS_PARTS, local.kiosk_url_html)
         
         return Handler
 
 
+def _has_multitouch_axes(abs_bitmap):
+    """Check the B: ABS= bitmap for ABS_MT_POSITION_X/Y (codes 0x35 and 0x36)."""
+    word_bits = struct.calcsize("l") * 8
+    bits = 0
+    for word in abs_bitmap.split():
+        bits = (bits << word_bits) | int(word, 16)
+    return bool(bits >> 0x35 & 1 and bits >> 0x36 & 1)
+
+
 def is_touch_working():
     """Check if USB touchscreen is working."""
     try:
-        # Check xinput for touch devices
-        result = subprocess.run(
-            ["xinput", "list"],
-            capture_output=True,
-            text=True,
-            timeout=5,
-            env=get_display_env()
-        )
-        if result.returncode == 0:
-            output = result.stdout.lower()
-            if "touch" in output or "finger" in output:
-                return True
-        
-        # Check libinput
-        result = subprocess.run(
-            ["libinput", "list-devices"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0 and "touch" in result.stdout.lower():
-            return True
-        
-        return False
-    except:
+        with open(INPUT_DEVICES_PATH, "r") as f:
+            devices = f.read().split("\n\n")
+    except OSError:
         return False
+    for device in devices:
+        name = ""
+        handlers = ""
+        abs_bitmap = ""
+        for line in device.splitlines():
+            if line.startswith("N: Name="):
+                name = line[8:].lower()
+            elif line.startswith("H: Handlers="):
+                handlers = line[12:]
+            elif line.startswith("B: ABS="):
+                abs_bitmap = line[7:]
+        if "event" not in handlers:
+            continue
+        if "touch" in name or "finger" in name:
+            return True
+        if abs_bitmap and _has_multitouch_axes(abs_bitmap):
+            return True
+    return False
 
 
 def reset_usb_touch():
     """Try to reset USB touchscreen."""
     print("Attempting USB touchscreen reset...")
     try:
-        # Reload HID modules
-        subprocess.run(["sudo", "modprobe", "-r", "usbhid"], timeout=10, capture_output=True)
-        time.sleep(1)
-        subprocess.run(["sudo", "modprobe", "usbhid"], timeout=10, capture_output=True)
-        time.sleep(1)
-        
-        # Trigger udev
-        subprocess.run(["sudo", "udevadm", "trigger"], timeout=10, capture_output=True)
-        subprocess.run(["sudo", "udevadm", "settle"], timeout=30, capture_output=True)
+        # Reload HID modules and re-trigger udev in a single sudo shell
+        subprocess.run(
+            [
+                "sudo", "sh", "-c",
+                "modprobe -r usbhid; sleep 1; modprobe usbhid; sleep 1; "
+                "udevadm trigger; udevadm settle --timeout=30",
+            ],
+            timeout=45,
+            capture_output=True
+        )
         
         print("USB reset completed")
         return True
@@ -602,8 +903,61 @@ def reset_usb_touch():
         return False
 
 
+def _is_touch_uevent(device):
+    name = (device.get("NAME") or "").lower()
+    return device.get("ID_INPUT_TOUCHSCREEN") == "1" or "touch" in name or "finger" in name
+
+
+def _touch_monitor_udev():
+    """Wait on udev input events instead of polling; act only when the touchscreen goes away."""
+    context = pyudev.Context()
+    monitor = pyudev.Monitor.from_netlink(context)
+    monitor.filter_by(subsystem="input")
+    monitor.start()
+    last_reset_time = 0
+    # A screen missing at startup never sends a remove event
+    missing = not is_touch_working()
+    
+    while True:
+        if not missing:
+            device = monitor.poll()
+            if device is None or device.action != "remove" or not _is_touch_uevent(device):
+                continue
+            print("Touchscreen removed, waiting for it to come back...")
+        
+        # Same grace period as three failed polls before forcing a reset
+        deadline = time.monotonic() + 45
+        recovered = False
+        while not recovered:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            device = monitor.poll(timeout=remaining)
+            if device is not None and device.action == "add" and _is_touch_uevent(device):
+                recovered = True
+        
+        if recovered or is_touch_working():
+            print("Touchscreen recovered")
+            missing = False
+            continue
+        
+        missing = True
+        current_time = time.time()
+        # Only reset once per 60 seconds
+        if current_time - last_reset_time > 60:
+            last_reset_time = current_time
+            reset_usb_touch()
+
+
 def touch_monitor_loop():
     """Background thread to monitor touchscreen health."""
+    if pyudev is not None:
+        try:
+            _touch_monitor_udev()
+            return
+        except Exception as e:
+            print(f"udev monitor unavailable, falling back to polling: {e}")
+    
     failure_count = 0
     last_reset_time = 0
     
@@ -636,6 +990,10 @@ def main():
     touch_thread.start()
     print("Touchscreen monitor started")
     
+    # One local server backs both the offline screen and the setup wizard
+    local_server = LocalServer()
+    local_server.start()
+    
     # Load existing config
     config = load_config()
     kiosk_url = config.get("kiosk_url", "")
@@ -643,43 +1001,48 @@ def main():
     # If we have a saved URL, manage connection with offline screen
     if kiosk_url:
         print(f"Found saved URL: {kiosk_url}")
-        offline_screen = None
         was_offline = False
+        backoff = OFFLINE_BACKOFF_START
         
-        while True:
-            if check_server(kiosk_url):
+        while not _stop_event.is_set():
+            online = check_server(kiosk_url, use_cache=False, timeout=LIVENESS_PROBE_TIMEOUT)
+            if not online and not was_offline:
+                # Re-probe once right away so one lost packet doesn't blank the kiosk
+                online = check_server(kiosk_url, use_cache=False, timeout=LIVENESS_PROBE_TIMEOUT)
+            if online:
                 # Server is online
-                if was_offline or offline_screen:
+                local_server.show_online(kiosk_url)
+                if was_offline:
                     print("Server is back online!")
-                    if offline_screen:
-                        offline_screen.stop()
-                        offline_screen = None
                     was_offline = False
-                    launch_browser(kiosk_url)
-                elif not was_offline:
+                else:
                     # First run, launch browser
                     print("Server is online, launching kiosk...")
-                    launch_browser(kiosk_url)
+                launch_browser(kiosk_url)
                 
                 # Check every 30 seconds while online
-                time.sleep(30)
+                backoff = OFFLINE_BACKOFF_START
+                _stop_event.wait(ONLINE_POLL_INTERVAL)
             else:
                 # Server is offline
                 if not was_offline:
                     print("Server is offline, showing offline screen...")
                     was_offline = True
-                    if offline_screen:
-                        offline_screen.stop()
-                    offline_screen = OfflineScreen(kiosk_url)
-                    offline_screen.start()
+                    local_server.show_offline(kiosk_url)
+                else:
+                    # Relaunch a crashed Chromium; a no-op while it shows the offline page
+                    launch_browser(f"http://{SETUP_HOST}:{SETUP_PORT}/offline")
                 
-                # Check every 10 seconds while offline
-                time.sleep(10)
+                # Retry quickly after an outage starts, then back off
+                _stop_event.wait(backoff)
+                backoff = min(backoff * OFFLINE_BACKOFF_FACTOR, OFFLINE_BACKOFF_MAX)
+        local_server.stop()
+        return
     
     # No saved URL - run setup wizard
     print("Starting setup wizard...")
-    wizard = SetupWizard()
-    result_url = wizard.start()
+    result_url = local_server.run_wizard()
+    local_server.stop()
     
     if result_url:
         print(f"Setup complete! URL: {result_url}")
@@ -692,7 +1055,8 @@ def main():
 
 def signal_handler(signum, frame):
     print(f"Received signal {signum}, exiting...")
-    sys.exit(0)
+    # main's loops watch the event and close the local server on the way out
+    _stop_event.set()
 
 
 if __name__ == "__main__":
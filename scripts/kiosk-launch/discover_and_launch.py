@@ -1,10 +1,22 @@
+import atexit
+import collections
+import errno
+import functools
+import http.client
+import json
 import logging
 import os
+import random
+import re
+import selectors
+import signal
 import subprocess
 import time
 import requests
 import threading
-from zeroconf import ServiceBrowser, Zeroconf
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from requests.adapters import HTTPAdapter
+from zeroconf import DNSQuestionType, ServiceBrowser, ServiceStateChange, Zeroconf
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,34 +24,180 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Constants
 KIOSK_CONF_PATH = "/etc/kiosk.conf"
 CACHE_PATH = "/var/cache/kiosk_server.json"
+ARP_TABLE_PATH = "/proc/net/arp"
 OFFLINE_URL = "file:///usr/share/kiosk-offline/index.html"
 SERVICE_TYPE = "_eform._tcp.local."
 HEALTH_CHECK_TIMEOUT = 5
+HEALTHY_POLL_INTERVAL = 30 # Fallback health check period; mDNS changes wake us sooner
+HEALTHY_POLL_MIN = 5 # Floor for the adaptive health check schedule
+HEALTH_CHECK_SLACK = 1 # Seconds after a past outage's uptime to check
+UPTIME_HISTORY_SIZE = 16 # Server uptimes remembered for the schedule
 DISCOVERY_TIMEOUT_MS = 8000 # 8 seconds global cap
-BACKOFF_BASE_MS = 1000
+MDNS_BROWSE_TIMEOUT = 2 # Seconds; the wait returns as soon as the service is found
+SERVICE_INFO_TIMEOUT_MS = 200
+SERVICE_NAME_PREFIXES = ("e-form",) # Gateway advertises "E-Form Main Server"
+BACKOFF_BASE_MS = 500
 BACKOFF_MAX_MS = 30000
+BACKOFF_FACTOR = 1.3 # Dense retries in the 1-10 s band where most outages end
+BACKOFF_JITTER = 0.1 # +/-10% so kiosks rebooting together don't poll in lockstep
+DISCOVERY_CACHE_TTL = 300 # Seconds a successful discovery is reused
+TOKEN_CACHE_TTL = 30 # Seconds a validated token is trusted without asking /discover
+SCAN_WORKERS = 64
+SCAN_TIMEOUT = 0.1 # Short timeout for scanning
+PRIORITY_SCAN_WINDOW = 0.5 # Seconds to wait on likely hosts before sweeping the subnet
+ZONE_RE = re.compile(rb'(?m)^[ \t]*ZONE=(\S+)')
+LIKELY_HOST_SUFFIXES = (1, 100, 254) # Gateway and common static server addresses
+KILL_GRACE_SECONDS = 0.5 # SIGTERM grace before escalating to SIGKILL
+KILL_POLL_INTERVAL = 0.025
+
+# One pooled session for every HTTP call so probes and health checks reuse
+# keep-alive connections; retries are ours to schedule, not urllib3's
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0))
+
+# Last successful discovery: (expires_at, (ip, gateway_port, kiosk_port, token))
+_discovery_cache = None
+# Validated tokens: ip -> (expires_at, token)
+_validated_tokens = {}
+# Last /discover/token answer: ip -> (etag, token bytes)
+_token_etags = {}
+
+# Runs the token and health checks of one poll side by side
+_check_executor = ThreadPoolExecutor(max_workers=2)
+
+# How long the server stayed healthy before each past outage, in seconds
+_uptimes = collections.deque(maxlen=UPTIME_HISTORY_SIZE)
+
+# Chromium we launched and the URL it is showing
+_chromium_proc = None
+_chromium_url = None
+
+# Shared across discovery attempts so each retry skips the multicast socket setup
+_zeroconf = None
+# Browser and listener live for the whole process and track the server continuously
+_mdns_browser = None
+_mdns_listener = None
+
+def get_zeroconf():
+    """
+    Returns the process-wide Zeroconf instance, creating it on first use.
+    """
+    global _zeroconf
+    if _zeroconf is None:
+        _zeroconf = Zeroconf()
+        atexit.register(close_mdns)
+    return _zeroconf
+
+def close_mdns():
+    """
+    Cancels the shared mDNS browser and closes Zeroconf, leaving the multicast group.
+    """
+    global _zeroconf, _mdns_browser, _mdns_listener
+    if _mdns_browser is not None:
+        _mdns_browser.cancel()
+        _mdns_browser = None
+        _mdns_listener = None
+    if _zeroconf is not None:
+        _zeroconf.close()
+        _zeroconf = None
 
 class ServerListener:
     def __init__(self):
         self.server_info = None
         self.lock = threading.Lock()
         self.event = threading.Event()
+        # Set whenever the advertised server appears, changes or goes away
+        self.changed = threading.Event()
+        # Browsed names that pass the prefix filter, resolved or not
+        self.candidates = set()
+
+    def on_service_state_change(self, zeroconf, service_type, name, state_change):
+        # A gateway restart republishes with a new token (and maybe a new IP)
+        # without a goodbye, so it shows up only as an Update
+        if state_change in (ServiceStateChange.Added, ServiceStateChange.Updated):
+            self.add_service(zeroconf, service_type, name)
+        elif state_change is ServiceStateChange.Removed:
+            self.remove_service(zeroconf, service_type, name)
+
+    def resolve_candidates(self, zeroconf):
+        """
+        Queries SRV/TXT again for every known candidate name.
+        """
+        with self.lock:
+            names = list(self.candidates)
+        for name in names:
+            self.add_service(zeroconf, SERVICE_TYPE, name)
+
+    def forget(self):
+        """
+        Drops the held server so the next discovery does not trust it.
+        """
+        with self.lock:
+            self.server_info = None
+            self.event.clear()
 
     def remove_service(self, zeroconf, type, name):
         logging.info(f"Service {name} removed")
         with self.lock:
-            self.server_info = None
+            self.candidates.discard(name)
+            if self.server_info and self.server_info.name == name:
+                self.server_info = None
+                self.event.clear()
+                self.changed.set()
 
     def add_service(self, zeroconf, type, name):
-        info = zeroconf.get_service_info(type, name)
+        # Only query SRV/TXT for names that can be ours
+        if not name.lower().startswith(SERVICE_NAME_PREFIXES):
+            return
+        with self.lock:
+            self.candidates.add(name)
+        # A short timeout keeps the browser thread responsive; a name that does
+        # not answer in time is resolved again on its next Update or discovery
+        info = zeroconf.get_service_info(type, name, timeout=SERVICE_INFO_TIMEOUT_MS)
         if info:
             with self.lock:
                 # Check for the correct role in the TXT records
                 if info.properties.get(b'role') == b'main-server':
-                    self.server_info = info
-                    logging.info(f"Service {name} added, service info: {info}")
+                    if not same_server_record(self.server_info, info):
+                        self.server_info = info
+                        logging.info(f"Service {name} added or updated, service info: {info}")
+                        self.changed.set()
                     self.event.set()
+                elif self.server_info and self.server_info.name == name:
+                    # Our server's record no longer advertises the main-server role
+                    self.server_info = None
+                    self.event.clear()
+                    self.changed.set()
 
+def same_server_record(old, new):
+    """
+    Whether two service infos point at the same server with the same TXT (token).
+    """
+    return (
+        old is not None
+        and old.name == new.name
+        and old.port == new.port
+        and old.addresses == new.addresses
+        and old.properties == new.properties
+    )
+
+def get_mdns_listener():
+    """
+    Starts the process-wide mDNS browser on first use and returns its listener.
+    """
+    global _mdns_browser, _mdns_listener
+    if _mdns_listener is None:
+        _mdns_listener = ServerListener()
+        # Ask for a unicast (QU) reply first so responders answer without the multicast delay
+        _mdns_browser = ServiceBrowser(
+            get_zeroconf(),
+            SERVICE_TYPE,
+            handlers=[_mdns_listener.on_service_state_change],
+            question_type=DNSQuestionType.QU,
+        )
+    return _mdns_listener
+
+@functools.lru_cache(maxsize=1)
 def get_zone():
     """
     Gets the kiosk zone from the environment variable or a config file.
@@ -50,12 +208,13 @@ def get_zone():
         return zone
 
     try:
-        with open(KIOSK_CONF_PATH, "r") as f:
-            for line in f:
-                if line.strip().startswith("ZONE="):
-                    zone = line.strip().split("=")[1]
-                    logging.info(f"Got zone from config file: {zone}")
-                    return zone
+        # One read and one regex search over the raw bytes
+        with open(KIOSK_CONF_PATH, "rb") as f:
+            match = ZONE_RE.search(f.read())
+        if match:
+            zone = match.group(1).decode("utf-8")
+            logging.info(f"Got zone from config file: {zone}")
+            return zone
     except FileNotFoundError:
         logging.warning(f"Config file not found at {KIOSK_CONF_PATH}")
     except Exception as e:
@@ -68,12 +227,14 @@ def discover_server_mdns():
     """
     Discovers the server using mDNS.
     """
-    zeroconf = Zeroconf()
-    listener = ServerListener()
-    browser = ServiceBrowser(zeroconf, SERVICE_TYPE, listener)
+    listener = get_mdns_listener()
 
-    # Wait for the service to be discovered, with a timeout
-    listener.event.wait(timeout=2) # 2 seconds per query
+    # Retry names whose info never resolved or was dropped after a failed check
+    if not listener.event.is_set():
+        listener.resolve_candidates(get_zeroconf())
+
+    # Returns at once if the long-lived browser already knows the server
+    listener.event.wait(timeout=MDNS_BROWSE_TIMEOUT)
 
     with listener.lock:
         if listener.server_info:
@@ -84,34 +245,137 @@ def discover_server_mdns():
             kiosk_port = int(info.properties.get(b'kioskPort', b'3002').decode('utf-8'))
 
             logging.info(f"kiosk-discovery: Discovered server via mDNS: ip={ip_address}, port={port}")
-            zeroconf.close()
             return ip_address, port, kiosk_port, token
         else:
             logging.warning("kiosk-discovery: Could not discover server via mDNS.")
-            zeroconf.close()
             return None, None, None, None
 
 import socket
 
+# Local IP found by get_local_ip; cleared when a scan misses in case DHCP moved us
+_local_ip = None
+
 def get_local_ip():
     """
     Gets the local IP address of the kiosk.
     """
+    global _local_ip
+    if _local_ip:
+        return _local_ip
     try:
         # This is a bit of a hack, but it works in most cases
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 80))
         ip = s.getsockname()[0]
         s.close()
+        _local_ip = ip
         return ip
     except Exception as e:
         logging.error(f"Could not get local IP: {e}")
         return None
 
+def fetch_json(ip, port, path, timeout):
+    """
+    Minimal GET returning the decoded JSON body, or None on any failure.
+
+    Uses http.client directly; requests' per-call overhead adds up over a
+    254-host scan of an endpoint that returns a few hundred bytes.
+    """
+    conn = http.client.HTTPConnection(ip, port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        if response.status != 200:
+            return None
+        return json.loads(response.read())
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    finally:
+        conn.close()
+
+def find_listening_hosts(ips, port, timeout):
+    """
+    Returns the IPs that accept a TCP connection on port, in the order they answered.
+
+    Starts a non-blocking connect to every address at once and waits on all of
+    them in one selector, the way connect-mode port scanners do, so a /24 costs
+    one thread and one timeout instead of a thread per address.
+    """
+    selector = selectors.DefaultSelector()
+    listening = []
+    try:
+        for ip in ips:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setblocking(False)
+            if s.connect_ex((ip, port)) in (0, errno.EINPROGRESS):
+                selector.register(s, selectors.EVENT_WRITE, ip)
+            else:
+                s.close()
+
+        deadline = time.monotonic() + timeout
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    listening.append(key.data)
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+    except OSError as e:
+        logging.warning(f"kiosk-discovery: Connect sweep aborted: {e}")
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    return listening
+
+def probe_discover_endpoint(ip):
+    """
+    Probes a single IP for the e-form /discover endpoint.
+    """
+    # Failures are expected for most IPs, so we don't log them
+    data = fetch_json(ip, 3000, "/discover", SCAN_TIMEOUT)
+    if isinstance(data, dict) and data.get("role") == "main-server":
+        return ip, data.get("gatewayPort", 3000)
+    return None
+
+def get_arp_neighbours(subnet_base):
+    """
+    Returns IPs in the subnet that the kernel ARP cache already knows are reachable.
+    """
+    try:
+        with open(ARP_TABLE_PATH, "r") as f:
+            lines = f.read().splitlines()[1:] # Skip header
+    except OSError:
+        return []
+
+    neighbours = []
+    for line in lines:
+        fields = line.split()
+        # Flags 0x2 marks a completed entry
+        if len(fields) >= 3 and int(fields[2], 16) & 0x2 and fields[0].startswith(subnet_base + "."):
+            neighbours.append(fields[0])
+    return neighbours
+
+def first_discover_hit(futures, timeout=None):
+    """
+    Returns the first successful probe result among futures, or None.
+    """
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            result = future.result()
+            if result:
+                return result
+    except FutureTimeoutError:
+        pass
+    return None
+
 def discover_server_http_scan():
     """
     Discovers the server by scanning the local subnet.
     """
+    global _local_ip
     local_ip = get_local_ip()
     if not local_ip:
         return None, None
@@ -129,40 +393,43 @@ def discover_server_http_scan():
 
     logging.info(f"Scanning subnet {subnet_base}.0/24 for e-form server...")
 
-    for i in range(1, 255):
-        ip_to_check = f"{subnet_base}.{i}"
-        discover_url = f"http://{ip_to_check}:3000/discover"
-        try:
-            response = requests.get(discover_url, timeout=0.1) # Short timeout for scanning
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("role") == "main-server":
-                    logging.info(f"Discovered server via HTTP scan: {ip_to_check}")
-                    return ip_to_check, data.get("gatewayPort", 3000)
-        except requests.RequestException:
-            # This is expected for most IPs, so we don't log it
-            pass
+    # Known neighbours and likely server addresses go first; the rest of the
+    # /24 is only swept if none of them answers
+    priority = get_arp_neighbours(subnet_base)
+    priority += [f"{subnet_base}.{i}" for i in LIKELY_HOST_SUFFIXES]
+    priority = [ip for ip in dict.fromkeys(priority) if ip != local_ip]
+    rest = [f"{subnet_base}.{i}" for i in range(1, 255) if f"{subnet_base}.{i}" not in priority]
 
+    executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS)
+    try:
+        futures = [executor.submit(probe_discover_endpoint, ip) for ip in priority]
+        result = first_discover_hit(futures, timeout=PRIORITY_SCAN_WINDOW)
+        if not result:
+            # Only hosts with port 3000 open get an HTTP probe; late
+            # priority answers still count
+            listening = find_listening_hosts(rest, 3000, SCAN_TIMEOUT)
+            futures += [executor.submit(probe_discover_endpoint, ip) for ip in listening]
+            result = first_discover_hit(futures)
+        if result:
+            logging.info(f"Discovered server via HTTP scan: {result[0]}")
+            return result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    _local_ip = None
     logging.warning("Could not discover server via HTTP scan.")
     return None, None
 
-import json
-
-def get_server_ip():
+def discover_server_hostname():
     """
-    Gets the server IP by trying mDNS first, then falling back to other methods.
+    Discovers the server by resolving mainserver.local and querying /discover.
     """
-    # Try mDNS first
-    ip, gateway_port, kiosk_port, token = discover_server_mdns()
-    if ip:
-        return ip, gateway_port, kiosk_port, token
-
-    # Fallback to resolving mainserver.local
+    ip = None
     try:
         ip = socket.gethostbyname('mainserver.local')
         # If resolved, we need to get other details via /discover
         discover_url = f"http://{ip}:3000/discover"
-        response = requests.get(discover_url, timeout=2)
+        response = SESSION.get(discover_url, timeout=2)
         if response.status_code == 200:
             data = response.json()
             if data.get("role") == "main-server":
@@ -170,20 +437,48 @@ def get_server_ip():
                 return ip, data.get("gatewayPort", 3000), data.get("kioskPort", 3002), data.get("token")
     except socket.gaierror:
         logging.warning("kiosk-discovery: Could not resolve mainserver.local.")
-    except requests.RequestException:
+    except (requests.RequestException, ValueError):
         logging.warning(f"kiosk-discovery: Found mainserver.local at {ip} but could not connect to /discover endpoint.")
+    return None, None, None, None
 
-
-    # Fallback to HTTP scan
+def discover_server_scan_details():
+    """
+    Discovers the server via HTTP scan and fetches its details from /discover.
+    """
     ip, gateway_port = discover_server_http_scan()
     if ip:
         # If found via scan, we need to get other details via /discover
         discover_url = f"http://{ip}:{gateway_port}/discover"
-        response = requests.get(discover_url, timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("role") == "main-server":
-                return ip, gateway_port, data.get("kioskPort", 3002), data.get("token")
+        try:
+            response = SESSION.get(discover_url, timeout=2)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("role") == "main-server":
+                    return ip, gateway_port, data.get("kioskPort", 3002), data.get("token")
+        except (requests.RequestException, ValueError):
+            logging.warning(f"kiosk-discovery: Could not fetch /discover details from {ip}")
+    return None, None, None, None
+
+def get_server_ip():
+    """
+    Gets the server IP by racing mDNS, mainserver.local and the HTTP scan, then falling back to the cache.
+    """
+    # Run every discovery method at once; wall time is the fastest success
+    # instead of the sum of all methods
+    methods = (discover_server_mdns, discover_server_hostname, discover_server_scan_details)
+    executor = ThreadPoolExecutor(max_workers=len(methods))
+    try:
+        futures = [executor.submit(method) for method in methods]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"kiosk-discovery: Discovery method failed: {e}")
+                continue
+            if result[0]:
+                return result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     # Read from cache if discovery fails
     try:
@@ -196,6 +491,116 @@ def get_server_ip():
 
     return None, None, None, None
 
+def get_server_ip_cached():
+    """
+    Returns the last discovery result while it is fresh, otherwise runs discovery again.
+    """
+    global _discovery_cache
+    if _discovery_cache and time.monotonic() < _discovery_cache[0]:
+        return _discovery_cache[1]
+
+    # Changes seen before this discovery are covered by it
+    get_mdns_listener().changed.clear()
+    result = get_server_ip()
+    if result[0]:
+        _discovery_cache = (time.monotonic() + DISCOVERY_CACHE_TTL, result)
+    return result
+
+def write_server_cache(data):
+    """
+    Atomically replaces the server cache file so a power cut never leaves it truncated.
+    """
+    tmp_path = CACHE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CACHE_PATH)
+
+def invalidate_discovery_cache(ip, forget_mdns=True):
+    """
+    Forgets the cached discovery and token for ip so the next poll rediscovers.
+
+    Unless told otherwise, the server held by the mDNS listener is dropped too,
+    so a stale record cannot win the next discovery race.
+    """
+    global _discovery_cache
+    _discovery_cache = None
+    _validated_tokens.pop(ip, None)
+    _token_etags.pop(ip, None)
+    if forget_mdns:
+        get_mdns_listener().forget()
+
+def fetch_server_token(ip, gateway_port):
+    """
+    Returns the server's current token as bytes, or None if it could not be read.
+
+    Asks the small /discover/token endpoint with If-None-Match so an unchanged
+    token comes back as a bodiless 304. Older gateways without that endpoint
+    answer 404 and are read through the full /discover JSON instead.
+    """
+    headers = {}
+    known = _token_etags.get(ip)
+    if known:
+        headers["If-None-Match"] = known[0]
+
+    response = SESSION.get(f"http://{ip}:{gateway_port}/discover/token", headers=headers, timeout=2)
+    if response.status_code == 304 and known:
+        return known[1]
+    if response.status_code == 200:
+        server_token = response.content.strip()
+        etag = response.headers.get("ETag")
+        if etag:
+            _token_etags[ip] = (etag, server_token)
+        return server_token
+    if response.status_code == 404:
+        response = SESSION.get(f"http://{ip}:{gateway_port}/discover", timeout=2)
+        if response.status_code == 200:
+            server_token = response.json().get("token")
+            if server_token:
+                return server_token.encode("utf-8")
+    return None
+
+def validate_token(ip, gateway_port, token):
+    """
+    Checks token against the server's /discover endpoint, reusing recent successes.
+    """
+    cached = _validated_tokens.get(ip)
+    if cached and cached[1] == token and time.monotonic() < cached[0]:
+        return True
+
+    try:
+        server_token = fetch_server_token(ip, gateway_port)
+        if server_token == token.encode("utf-8"):
+            logging.info(f"kiosk-discovery: Token validated for ip={ip}")
+            _validated_tokens[ip] = (time.monotonic() + TOKEN_CACHE_TTL, token)
+            return True
+        logging.warning(f"kiosk-discovery: Token validation failed for ip={ip}. Ignoring.")
+    except (requests.RequestException, ValueError):
+        logging.warning(f"kiosk-discovery: Could not connect to /discover to validate token for ip={ip}")
+    return False
+
+def record_outage(uptime):
+    """
+    Remembers how long the server was up before it failed.
+    """
+    _uptimes.append(uptime)
+
+def next_health_poll_delay(elapsed):
+    """
+    Returns the delay before the next health check, elapsed seconds into an uptime.
+
+    Polls every HEALTHY_POLL_INTERVAL, but when a past outage happened sooner
+    than that into its uptime, checks just after that point instead. Servers
+    that tend to fail at the same point after coming up are caught early, and
+    the schedule is never sparser than uniform polling.
+    """
+    delay = HEALTHY_POLL_INTERVAL
+    upcoming = [uptime - elapsed for uptime in _uptimes if uptime > elapsed]
+    if upcoming:
+        delay = min(delay, min(upcoming) + HEALTH_CHECK_SLACK)
+    return max(delay, HEALTHY_POLL_MIN)
+
 def check_server_health(ip, port):
     """
     Checks the health of the server.
@@ -205,7 +610,7 @@ def check_server_health(ip, port):
 
     health_url = f"http://{ip}:{port}/health"
     try:
-        response = requests.get(health_url, timeout=HEALTH_CHECK_TIMEOUT)
+        response = SESSION.get(health_url, timeout=HEALTH_CHECK_TIMEOUT)
         if response.status_code == 200:
             logging.info(f"Server at {ip}:{port} is healthy.")
             return True
@@ -216,14 +621,89 @@ def check_server_health(ip, port):
         logging.error(f"Error checking server health at {ip}:{port}: {e}")
         return False
 
+def check_server_ready(ip, gateway_port, kiosk_port, token):
+    """
+    Validates the token and checks health concurrently; both must pass.
+
+    Both requests go to the same host, so overlapping them saves a round trip
+    per poll. Returns as soon as either check fails.
+    """
+    if not token:
+        return check_server_health(ip, kiosk_port)
+    futures = [
+        _check_executor.submit(validate_token, ip, gateway_port, token),
+        _check_executor.submit(check_server_health, ip, kiosk_port),
+    ]
+    return all(future.result() for future in as_completed(futures))
+
+def find_chromium_pids():
+    """
+    Returns PIDs of running Chromium processes by reading /proc directly.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/comm", "r") as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if "chrom" in name:
+            pids.append(int(entry))
+    return pids
+
+def is_pid_alive(pid):
+    # Our own child stays a zombie until reaped, so ask Popen rather than kill(0)
+    if _chromium_proc and pid == _chromium_proc.pid:
+        return _chromium_proc.poll() is None
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def kill_chromium():
+    """
+    Terminates all Chromium processes and waits until they are gone.
+    """
+    pids = []
+    for pid in find_chromium_pids():
+        try:
+            os.kill(pid, signal.SIGTERM)
+            pids.append(pid)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    deadline = time.monotonic() + KILL_GRACE_SECONDS
+    while pids and time.monotonic() < deadline:
+        time.sleep(KILL_POLL_INTERVAL)
+        pids = [pid for pid in pids if is_pid_alive(pid)]
+
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if _chromium_proc and _chromium_proc.poll() is None:
+        _chromium_proc.kill()
+    if _chromium_proc:
+        _chromium_proc.wait()
+
 def launch_chromium(url):
     """
-    Launches Chromium in kiosk mode.
+    Launches Chromium in kiosk mode, unless it is already showing url.
     """
+    global _chromium_proc, _chromium_url
+    if url == _chromium_url and _chromium_proc and _chromium_proc.poll() is None:
+        logging.info(f"Chromium already showing {url}, not relaunching.")
+        return
+
     logging.info(f"Launching Chromium with URL: {url}")
     # Kill any existing chromium processes
-    subprocess.run(["pkill", "-f", "chromium-browser"])
-    time.sleep(1)
+    kill_chromium()
 
     command = [
         "chromium-browser",
@@ -239,7 +719,8 @@ def launch_chromium(url):
     env = os.environ.copy()
     env["DISPLAY"] = ":0"
 
-    subprocess.Popen(command, env=env)
+    _chromium_proc = subprocess.Popen(command, env=env)
+    _chromium_url = url
 
 def main():
     """
@@ -255,59 +736,64 @@ def main():
     logging.info(f"kiosk-launch: Starting with zone={zone}")
 
     current_ip = None
-    backoff_delay = 1 # Start with 1 second
+    online_since = time.monotonic()
+    backoff_delay = BACKOFF_BASE_MS / 1000
 
     while True:
-        ip, gateway_port, kiosk_port, token = get_server_ip()
+        ip, gateway_port, kiosk_port, token = get_server_ip_cached()
 
         if ip and kiosk_port:
-            # Validate token if we got one
-            if token:
-                discover_url = f"http://{ip}:{gateway_port}/discover"
-                try:
-                    response = requests.get(discover_url, timeout=2)
-                    if response.status_code == 200 and response.json().get("token") == token:
-                        logging.info(f"kiosk-discovery: Token validated for ip={ip}")
-                    else:
-                        logging.warning(f"kiosk-discovery: Token validation failed for ip={ip}. Ignoring.")
-                        ip = None # Invalidate discovery
-                except requests.RequestException:
-                    logging.warning(f"kiosk-discovery: Could not connect to /discover to validate token for ip={ip}")
-                    ip = None
-
-            if ip and check_server_health(ip, kiosk_port):
+            # Token (if we got one) and health are checked in one round trip
+            if check_server_ready(ip, gateway_port, kiosk_port, token):
                 if ip != current_ip:
                     logging.info(f"kiosk-launch: Server IP changed to {ip}, port={kiosk_port}. Relaunching kiosk.")
                     current_ip = ip
+                    online_since = time.monotonic()
                     # Cache the new IP and port
-                    with open(CACHE_PATH, "w") as f:
-                        json.dump({"ip": ip, "kioskPort": kiosk_port, "ts": time.time()}, f)
+                    write_server_cache({"ip": ip, "kioskPort": kiosk_port, "ts": time.time()})
 
                     url = f"http://{ip}:{kiosk_port}/?zone={zone}"
                     launch_chromium(url)
 
-                backoff_delay = 1 # Reset backoff on success
+                backoff_delay = BACKOFF_BASE_MS / 1000 # Reset backoff on success
             else:
-                # Server found but unhealthy
+                # Server found but unhealthy or its token is stale
+                invalidate_discovery_cache(ip)
                 if current_ip:
                     logging.warning(f"kiosk-health: Server at ip={ip} is unhealthy. Displaying offline screen.")
+                    record_outage(time.monotonic() - online_since)
                     launch_chromium(OFFLINE_URL)
                 current_ip = None
         else:
             # Server not found
             if current_ip:
                 logging.warning("kiosk-discovery: Server lost. Displaying offline screen.")
+                record_outage(time.monotonic() - online_since)
                 launch_chromium(OFFLINE_URL)
             current_ip = None
 
         if not current_ip:
             # If server is not found or unhealthy, sleep with exponential backoff
-            logging.info(f"kiosk-discovery: Waiting for {backoff_delay} seconds before retrying.")
-            time.sleep(backoff_delay)
-            backoff_delay = min(backoff_delay * 2, 30)
+            delay = backoff_delay * random.uniform(1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER)
+            logging.info(f"kiosk-discovery: Waiting for {delay:.1f} seconds before retrying.")
+            time.sleep(delay)
+            backoff_delay = min(backoff_delay * BACKOFF_FACTOR, BACKOFF_MAX_MS / 1000)
         else:
-            # If server is healthy, poll every 30 seconds
-            time.sleep(30)
+            # If server is healthy, re-check when mDNS reports a change or
+            # at the next scheduled health check, whichever comes first
+            listener = get_mdns_listener()
+            delay = next_health_poll_delay(time.monotonic() - online_since)
+            if listener.changed.wait(timeout=delay):
+                logging.info("kiosk-discovery: mDNS change detected, re-evaluating server.")
+                # The listener already holds the fresh record; keep it
+                invalidate_discovery_cache(current_ip, forget_mdns=False)
+
+def _handle_signal(signum, frame):
+    logging.info(f"kiosk-launch: Received signal {signum}, exiting.")
+    SESSION.close()
+    raise SystemExit(0)
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _handle_signal)
+    signal.signal(signal.SIGINT, _handle_signal)
     main()
@@ -11,12 +11,56 @@ Supports:
 
 import serial
 import serial.tools.list_ports
+import functools
 import struct
 import time
 import sys
 import os
+from types import MappingProxyType
 from typing import Optional, List, Dict, Tuple
 
+try:
+    from fastcrc import crc16 as _fastcrc16
+    _native_crc16 = _fastcrc16.modbus
+except ImportError:
+    try:
+        # crcmod only helps when its C extension was built
+        import crcmod._crcfunext
+        import crcmod.predefined
+        _native_crc16 = crcmod.predefined.mkPredefinedCrcFun('modbus')
+    except ImportError:
+        _native_crc16 = None
+
+def _build_crc16_table() -> Tuple[int, ...]:
+    """Build the byte-wise lookup table for the Modbus CRC16 (polynomial 0xA001)"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            # -(crc & 1) is all ones when the low bit is set, so no branch is needed
+            crc = (crc >> 1) ^ (-(crc & 0x0001) & 0xA001)
+        table.append(crc)
+    return tuple(table)
+
+# Every request this tool sends is slave, function, address, value + CRC;
+# a Write Single Register reply echoes the same layout
+_REQUEST_HEADER = struct.Struct('>BBHH')
+# Read Holding Register reply for one register: slave, function, byte count, value
+_READ_RESPONSE = struct.Struct('>BBBH')
+
+_CRC16_TABLE = _build_crc16_table()
+# Same step pushed through one more zero byte, so two bytes fold in per iteration
+_CRC16_TABLE_2 = tuple((crc >> 8) ^ _CRC16_TABLE[crc & 0xFF] for crc in _CRC16_TABLE)
+
+def _crc16_6(b0: int, b1: int, b2: int, b3: int, b4: int, b5: int) -> int:
+    """CRC16 of a 6-byte request body, unrolled into three two-byte table steps"""
+    t0 = _CRC16_TABLE
+    t1 = _CRC16_TABLE_2
+    # First step has the initial 0xFFFF folded in
+    crc = t1[0xFF ^ b0] ^ t0[0xFF ^ b1]
+    crc = t1[(crc ^ b2) & 0xFF] ^ t0[((crc >> 8) ^ b3) & 0xFF]
+    return t1[(crc ^ b4) & 0xFF] ^ t0[((crc >> 8) ^ b5) & 0xFF]
+
 class Colors:
     """ANSI color codes for terminal output"""
     RESET = '\033[0m'
@@ -27,16 +71,19 @@ class Colors:
     BLUE = '\033[34m'
     CYAN = '\033[36m'
 
+# Composed once; each log line is then a single write
+_COLOR_CODES = {name: code for name, code in vars(Colors).items() if not name.startswith('_')}
+_HEADER_START = f"{Colors.CYAN}{Colors.BRIGHT}"
+_HEADER_BORDER = f"{_HEADER_START}{'═' * 60}{Colors.RESET}"
+
 def log(message: str, color: str = 'RESET') -> None:
     """Print colored message"""
-    color_code = getattr(Colors, color.upper(), Colors.RESET)
-    print(f"{color_code}{message}{Colors.RESET}")
+    color_code = _COLOR_CODES.get(color.upper(), Colors.RESET)
+    sys.stdout.write(f"{color_code}{message}{Colors.RESET}\n")
 
 def log_header(message: str) -> None:
     """Print header with border"""
-    print(f"\n{Colors.CYAN}{Colors.BRIGHT}{'═' * 60}{Colors.RESET}")
-    print(f"{Colors.CYAN}{Colors.BRIGHT}  {message}{Colors.RESET}")
-    print(f"{Colors.CYAN}{Colors.BRIGHT}{'═' * 60}{Colors.RESET}\n")
+    sys.stdout.write(f"\n{_HEADER_BORDER}\n{_HEADER_START}  {message}{Colors.RESET}\n{_HEADER_BORDER}\n\n")
 
 def log_success(message: str) -> None:
     log(f"✅ {message}", 'GREEN')
@@ -55,42 +102,72 @@ class ModbusUtils:
     
     SLAVE_ADDRESS_REGISTER = 0x4000
     
+    # Modbus exception codes
+    ERROR_DESCRIPTIONS = MappingProxyType({
+        0x01: 'Illegal Function',
+        0x02: 'Illegal Data Address',
+        0x03: 'Illegal Data Value',
+        0x04: 'Slave Device Failure',
+        0x05: 'Acknowledge',
+        0x06: 'Slave Device Busy',
+        0x08: 'Memory Parity Error',
+        0x0A: 'Gateway Path Unavailable',
+        0x0B: 'Gateway Target Device Failed to Respond'
+    })
+    
+    # The build_* methods are memoized: frames are immutable bytes and a scan
+    # reuses the same few hundred, so each CRC is computed once
+    
     @staticmethod
     def calculate_crc16(data: bytes) -> int:
-        """Calculate CRC16 checksum for Modbus RTU"""
+        """Calculate CRC16 checksum for Modbus RTU data of any length (slicing-by-2 table lookup)"""
+        if _native_crc16 is not None:
+            return _native_crc16(bytes(data))
+        
         crc = 0xFFFF
+        t0 = _CRC16_TABLE
+        t1 = _CRC16_TABLE_2
+        even = len(data) & ~1
         
-        for byte in data:
-            crc ^= byte
-            for _ in range(8):
-                if crc & 0x0001:
-                    crc = (crc >> 1) ^ 0xA001
-                else:
-                    crc = crc >> 1
+        for i in range(0, even, 2):
+            crc = t1[(crc ^ data[i]) & 0xFF] ^ t0[((crc >> 8) ^ data[i + 1]) & 0xFF]
+        
+        if even != len(data):
+            crc = (crc >> 8) ^ t0[(crc ^ data[-1]) & 0xFF]
         
         return crc
     
     @staticmethod
+    def build_request(slave_id: int, function_code: int, address: int, value: int) -> bytes:
+        """Pack a request into one 8-byte buffer and append its CRC (low byte first)"""
+        frame = bytearray(8)
+        _REQUEST_HEADER.pack_into(frame, 0, slave_id, function_code, address, value)
+        if _native_crc16 is not None:
+            crc = _native_crc16(bytes(frame[:6]))
+        else:
+            crc = _crc16_6(slave_id, function_code, address >> 8, address & 0xFF, value >> 8, value & 0xFF)
+        frame[6] = crc & 0xFF
+        frame[7] = crc >> 8
+        return bytes(frame)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
     def build_read_register_command(slave_id: int, register: int = 0x4000, count: int = 1) -> bytes:
         """Build Read Holding Register command (Function 0x03)"""
-        data = struct.pack('>BBHH', slave_id, 0x03, register, count)
-        crc = ModbusUtils.calculate_crc16(data)
-        return data + struct.pack('<H', crc)
+        return ModbusUtils.build_request(slave_id, 0x03, register, count)
     
     @staticmethod
+    @functools.lru_cache(maxsize=512)
     def build_write_register_command(slave_id: int, register: int, value: int) -> bytes:
         """Build Write Single Register command (Function 0x06)"""
-        data = struct.pack('>BBHH', slave_id, 0x06, register, value)
-        crc = ModbusUtils.calculate_crc16(data)
-        return data + struct.pack('<H', crc)
+        return ModbusUtils.build_request(slave_id, 0x06, register, value)
     
     @staticmethod
+    @functools.lru_cache(maxsize=512)
     def build_write_coil_command(slave_id: int, coil: int, state: bool) -> bytes:
         """Build Write Single Coil command (Function 0x05) for relay testing"""
         value = 0xFF00 if state else 0x0000
-        data = struct.pack('>BBHH', slave_id, 0x05, coil, value)
-        crc = ModbusUtils.calculate_crc16(data)
-        return data + struct.pack('<H', crc)
+        return ModbusUtils.build_request(slave_id, 0x05, coil, value)
     
     @staticmethod
     def parse_read_response(response: bytes) -> Dict:
@@ -98,7 +175,8 @@ class ModbusUtils:
         if len(response) < 5:
             return {'success': False, 'error': 'Response too short'}
         
-        slave_id, function_code, byte_count = struct.unpack('>BBB', response[:3])
+        # Register value is big-endian; parsed straight from the buffer, no slices
+        slave_id, function_code, byte_count, value = _READ_RESPONSE.unpack_from(response, 0)
         
         if function_code == 0x83:  # Error response
             error_code = response[2]
@@ -107,9 +185,6 @@ class ModbusUtils:
         if function_code != 0x03:
             return {'success': False, 'error': f'Unexpected function code: 0x{function_code:02X}'}
         
-        # Extract register value (big-endian)
-        value = struct.unpack('>H', response[3:5])[0]
-        
         return {
             'success': True,
             'slave_id': slave_id,
@@ -118,13 +193,20 @@ class ModbusUtils:
             'value': value
         }
     
+    @staticmethod
+    def quick_probe(response: Optional[bytes]) -> Optional[int]:
+        """Return the register value from a Read Holding Register reply, or None"""
+        if not response or len(response) < 5 or response[1] != 0x03:
+            return None
+        return (response[3] << 8) | response[4]
+    
     @staticmethod
     def parse_write_response(response: bytes) -> Dict:
         """Parse Write Single Register response"""
         if len(response) < 8:
             return {'success': False, 'error': 'Response too short'}
         
-        slave_id, function_code = struct.unpack('>BB', response[:2])
+        slave_id, function_code, register, value = _REQUEST_HEADER.unpack_from(response, 0)
         
         if function_code == 0x86:  # Error response
             error_code = response[2]
@@ -133,8 +215,6 @@ class ModbusUtils:
         if function_code != 0x06:
             return {'success': False, 'error': f'Unexpected function code: 0x{function_code:02X}'}
         
-        register, value = struct.unpack('>HH', response[2:6])
-        
         return {
             'success': True,
             'slave_id': slave_id,
@@ -143,34 +223,37 @@ class ModbusUtils:
             'value': value
         }
     
-    @staticmethod
-    def get_error_description(error_code: int) -> str:
+    @classmethod
+    def get_error_description(cls, error_code: int) -> str:
         """Get human-readable error description"""
-        errors = {
-            0x01: 'Illegal Function',
-            0x02: 'Illegal Data Address',
-            0x03: 'Illegal Data Value',
-            0x04: 'Slave Device Failure',
-            0x05: 'Acknowledge',
-            0x06: 'Slave Device Busy',
-            0x08: 'Memory Parity Error',
-            0x0A: 'Gateway Path Unavailable',
-            0x0B: 'Gateway Target Device Failed to Respond'
-        }
-        return errors.get(error_code, f'Unknown error (0x{error_code:02X})')
+        return cls.ERROR_DESCRIPTIONS.get(error_code, f'Unknown error (0x{error_code:02X})')
     
     @staticmethod
     def format_hex(data: bytes) -> str:
         """Format bytes as hex string for display"""
-        return ' '.join(f'{b:02X}' for b in data)
+        return data.hex(' ').upper()
 
 class SlaveIdChanger:
     """Main class for changing Waveshare Modbus slave addresses"""
     
+    BAUDRATE = 9600
+    CHAR_TIME = 10 / BAUDRATE  # 8N1: start + 8 data + stop bits per byte
+    RESPONSE_MARGIN = 0.05  # Device turnaround plus USB adapter latency
+    RTT_SMOOTHING = 0.25  # Weight of the newest round trip in observed_rtt
+    RTT_WAIT_FACTOR = 3  # Wait this many observed round trips for a reply
+    MIN_RESPONSE_WAIT = 0.02
+    
     def __init__(self, debug: bool = False):
         self.debug = debug
         self.serial_port: Optional[serial.Serial] = None
         self.timeout = 1.0
+        # Smoothed request-to-reply time of scan probes in the current scan
+        self.observed_rtt: Optional[float] = None
+        # False when stale bytes may still sit in the receive buffer
+        self._rx_clean = False
+        # Modbus RTU silent interval (t3.5) and when the bus last went quiet
+        self._t35 = 0.0
+        self._bus_idle_at = 0.0
     
     def list_ports(self) -> List[Dict]:
         """List available COM ports"""
@@ -188,12 +271,16 @@ class SlaveIdChanger:
         try:
             self.serial_port = serial.Serial(
                 port=port_name,
-                baudrate=9600,
+                baudrate=self.BAUDRATE,
                 bytesize=8,
                 parity='N',
                 stopbits=1,
                 timeout=self.timeout
             )
+            self._enable_low_latency()
+            self._rx_clean = False
+            # 3.5 characters of 11 bits; the spec fixes it at 1.75 ms above 19200 baud
+            self._t35 = max(3.5 * 11 / self.serial_port.baudrate, 0.00175)
             if self.debug:
                 log_success(f"Connected to {port_name}")
             return True
@@ -201,6 +288,41 @@ class SlaveIdChanger:
             log_error(f"Failed to connect to {port_name}: {e}")
             return False
     
+    def _enable_low_latency(self) -> None:
+        """Ask the USB-serial driver to forward bytes immediately (Linux only)"""
+        # FTDI/CH340 adapters otherwise hold small frames for a ~16 ms latency timer
+        try:
+            self.serial_port.set_low_latency_mode(True)
+            if self.debug:
+                log_info("Low latency mode enabled")
+        except (AttributeError, NotImplementedError, ValueError) as e:
+            # Not available on Windows/macOS or refused by the driver; keep defaults
+            if self.debug:
+                log_warning(f"Low latency mode unavailable: {e}")
+    
+    def _response_wait(self, frame_bytes: int) -> float:
+        """How long to wait for a reply: a few observed round trips once known, else wire time + margin"""
+        if self.observed_rtt is None:
+            return frame_bytes * self.CHAR_TIME + self.RESPONSE_MARGIN
+        return max(self.RTT_WAIT_FACTOR * self.observed_rtt, self.MIN_RESPONSE_WAIT)
+    
+    def _record_rtt(self, rtt: float) -> None:
+        """Fold a successful round trip into observed_rtt"""
+        if self.observed_rtt is None:
+            self.observed_rtt = rtt
+        else:
+            self.observed_rtt += self.RTT_SMOOTHING * (rtt - self.observed_rtt)
+    
+    def resync(self) -> None:
+        """Discard anything buffered in either direction"""
+        self.serial_port.reset_input_buffer()
+        self.serial_port.reset_output_buffer()
+        self._rx_clean = True
+    
+    def is_connected(self) -> bool:
+        """Whether the COM port is currently open"""
+        return self.serial_port is not None and self.serial_port.is_open
+    
     def disconnect(self) -> None:
         """Disconnect from COM port"""
         if self.serial_port and self.serial_port.is_open:
@@ -208,8 +330,8 @@ class SlaveIdChanger:
             if self.debug:
                 log_success("Disconnected")
     
-    def send_command(self, command: bytes, expected_length: int = 8) -> Optional[bytes]:
-        """Send command and wait for response"""
+    def send_command(self, command: bytes, expected_length: int = 8, probe: bool = False) -> Optional[bytes]:
+        """Send command and wait for response (probe=True: short adaptive wait for scans)"""
         if not self.serial_port or not self.serial_port.is_open:
             log_error("Port not open")
             return None
@@ -218,9 +340,16 @@ class SlaveIdChanger:
             if self.debug:
                 log_info(f"Sending: {ModbusUtils.format_hex(command)}")
             
-            # Clear buffers
-            self.serial_port.reset_input_buffer()
-            self.serial_port.reset_output_buffer()
+            # Only flush when the last exchange may have left a partial or
+            # late reply behind; a complete read leaves the buffer empty
+            if not self._rx_clean:
+                self.serial_port.reset_input_buffer()
+            self._rx_clean = False
+            
+            # Keep the line quiet for t3.5 since the last exchange ended
+            gap = self._bus_idle_at + self._t35 - time.monotonic()
+            if gap > 0:
+                time.sleep(gap)
             
             # Send command
             self.serial_port.write(command)
@@ -228,18 +357,54 @@ class SlaveIdChanger:
             # For broadcast commands, don't expect response
             if expected_length == 0:
                 time.sleep(0.1)  # Give device time to process
+                self._bus_idle_at = time.monotonic()
                 return b''
             
-            # Read response
-            response = self.serial_port.read(expected_length)
+            # Drain whatever has arrived until the frame is complete or the
+            # wait has passed. Scan probes use the short adaptive wait so a
+            # silent address costs tens of milliseconds; everything else
+            # (e.g. a register write committing to EEPROM) gets the full timeout
+            sent_at = time.monotonic()
+            if probe:
+                deadline = sent_at + self._response_wait(len(command) + expected_length)
+            else:
+                deadline = sent_at + self.timeout
+            # Chunks are appended in place; one bytes copy is made on return
+            response = bytearray()
+            while len(response) < expected_length:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waiting = self.serial_port.in_waiting
+                if waiting:
+                    response += self.serial_port.read(min(waiting, expected_length - len(response)))
+                    # A reply is under way: let the rest of the frame arrive
+                    deadline = max(deadline, time.monotonic() + (expected_length - len(response)) * self.CHAR_TIME + self.RESPONSE_MARGIN)
+                else:
+                    time.sleep(min(self.CHAR_TIME, remaining))
+            
+            self._bus_idle_at = time.monotonic()
+            if len(response) == expected_length:
+                if probe:
+                    self._record_rtt(self._bus_idle_at - sent_at)
+                self._rx_clean = True
             
             if self.debug and response:
                 log_info(f"Received: {ModbusUtils.format_hex(response)}")
             
-            return response if len(response) > 0 else None
+            return bytes(response) if len(response) > 0 else None
             
         except Exception as e:
             log_error(f"Communication error: {e}")
+            try:
+                self.resync()
+            except Exception:
+                # The port itself is broken; close and drop it so the next action reopens it
+                try:
+                    self.serial_port.close()
+                except Exception:
+                    pass
+                self.serial_port = None
             return None
     
     def read_slave_address(self, slave_id: int) -> Dict:
@@ -350,21 +515,36 @@ class SlaveIdChanger:
         
         log_info(f"Scanning for devices (addresses {start_address}-{end_address})...")
         
-        for addr in range(start_address, end_address + 1):
-            print(f"   Checking address {addr}... ", end='', flush=True)
-            
-            result = self.read_slave_address(addr)
-            
-            if result['success']:
-                print(f"✅ Found! (Address: {result['current_address']})")
-                found_devices.append({
-                    'address': addr,
-                    'reported_address': result['current_address']
-                })
-            else:
-                print("❌ No response")
-            
-            time.sleep(0.1)  # Small delay between scans
+        # Build (and memoize) every probe frame in one batch before touching
+        # the bus, so the probe loop itself does no packing or CRC work
+        probes = [
+            (addr, ModbusUtils.build_read_register_command(addr, ModbusUtils.SLAVE_ADDRESS_REGISTER, 1))
+            for addr in range(start_address, end_address + 1)
+        ]
+        
+        # The adaptive wait is learned per scan and never outlives it
+        self.observed_rtt = None
+        try:
+            for addr, command in probes:
+                print(f"   Checking address {addr}... ", end='', flush=True)
+                
+                # A scan only needs the reported address, not the full parse
+                reported_address = ModbusUtils.quick_probe(self.send_command(command, 7, probe=True))
+                
+                if reported_address is not None:
+                    print(f"✅ Found! (Address: {reported_address})")
+                    found_devices.append({
+                        'address': addr,
+                        'reported_address': reported_address
+                    })
+                else:
+                    print("❌ No response")
+                
+                if not self.is_connected():
+                    log_error("Port closed after a communication error; scan stopped.")
+                    break
+        finally:
+            self.observed_rtt = None
         
         return found_devices
     
@@ -485,17 +665,25 @@ class InteractiveCLI:
             if 0 <= index < len(ports):
                 self.selected_port = ports[index]['device']
                 log_success(f"Selected: {self.selected_port}")
+                # Open once here and keep it open for the rest of the session
+                self.changer.disconnect()
+                self.changer.connect(self.selected_port)
             else:
                 log_warning('Invalid selection.')
         except ValueError:
             log_warning('Invalid input. Please enter a number.')
     
     def ensure_port(self) -> bool:
-        """Ensure a COM port is selected"""
+        """Ensure a COM port is selected and open"""
         if not self.selected_port:
             log_warning('No COM port selected. Please select one first.')
             self.select_port()
-        return self.selected_port is not None
+        if not self.selected_port:
+            return False
+        # The port stays open between actions; reopen only if an error closed it
+        if not self.changer.is_connected():
+            return self.changer.connect(self.selected_port)
+        return True
     
     def scan_devices(self):
         """Scan for devices"""
@@ -508,18 +696,14 @@ class InteractiveCLI:
         start = int(start_addr) if start_addr.isdigit() else 1
         end = int(end_addr) if end_addr.isdigit() else 10
         
-        if self.changer.connect(self.selected_port):
-            try:
-                devices = self.changer.scan_devices(start, end)
-                
-                if devices:
-                    log_success(f"Found {len(devices)} device(s):")
-                    for d in devices:
-                        print(f"  - Address {d['address']} (reports address: {d['reported_address']})")
-                else:
-                    log_warning('No devices found in the specified range.')
-            finally:
-                self.changer.disconnect()
+        devices = self.changer.scan_devices(start, end)
+        
+        if devices:
+            log_success(f"Found {len(devices)} device(s):")
+            for d in devices:
+                print(f"  - Address {d['address']} (reports address: {d['reported_address']})")
+        else:
+            log_warning('No devices found in the specified range.')
     
     def read_address(self):
         """Read current slave address"""
@@ -537,17 +721,13 @@ class InteractiveCLI:
             log_error('Invalid input. Please enter a number.')
             return
         
-        if self.changer.connect(self.selected_port):
-            try:
-                result = self.changer.read_slave_address(address)
-                
-                if result['success']:
-                    log_success(f"Device at address {address} reports slave address: {result['current_address']}")
-                    print(f"  Raw response: {result['raw_response']}")
-                else:
-                    log_error(f"Failed to read: {result['error']}")
-            finally:
-                self.changer.disconnect()
+        result = self.changer.read_slave_address(address)
+        
+        if result['success']:
+            log_success(f"Device at address {address} reports slave address: {result['current_address']}")
+            print(f"  Raw response: {result['raw_response']}")
+        else:
+            log_error(f"Failed to read: {result['error']}")
     
     def change_address(self):
         """Change slave address"""
@@ -601,18 +781,14 @@ class InteractiveCLI:
             log_info('Operation cancelled.')
             return
         
-        if self.changer.connect(self.selected_port):
-            try:
-                result = self.changer.set_slave_address(current_address, new_address)
-                
-                if result['success']:
-                    log_success(result['message'])
-                    if result.get('verified'):
-                        log_success('Address change verified successfully!')
-                else:
-                    log_error(f"Failed: {result['error']}")
-            finally:
-                self.changer.disconnect()
+        result = self.changer.set_slave_address(current_address, new_address)
+        
+        if result['success']:
+            log_success(result['message'])
+            if result.get('verified'):
+                log_success('Address change verified successfully!')
+        else:
+            log_error(f"Failed: {result['error']}")
     
     def test_relay(self):
         """Test relay activation"""
@@ -639,26 +815,22 @@ class InteractiveCLI:
             log_error('Invalid input. Please enter a number.')
             return
         
-        if self.changer.connect(self.selected_port):
-            try:
-                log_info(f"Turning ON relay {relay} on device {address}...")
-                on_result = self.changer.test_relay(address, relay, True)
-                
-                if on_result['success']:
-                    log_success(f"Relay {relay} turned ON")
-                    
-                    time.sleep(1)
-                    
-                    log_info(f"Turning OFF relay {relay}...")
-                    off_result = self.changer.test_relay(address, relay, False)
-                    
-                    if off_result['success']:
-                        log_success(f"Relay {relay} turned OFF")
-                        log_success('Relay test completed successfully!')
-                else:
-                    log_error(f"Test failed: {on_result['error']}")
-            finally:
-                self.changer.disconnect()
+        log_info(f"Turning ON relay {relay} on device {address}...")
+        on_result = self.changer.test_relay(address, relay, True)
+        
+        if on_result['success']:
+            log_success(f"Relay {relay} turned ON")
+            
+            time.sleep(1)
+            
+            log_info(f"Turning OFF relay {relay}...")
+            off_result = self.changer.test_relay(address, relay, False)
+            
+            if off_result['success']:
+                log_success(f"Relay {relay} turned OFF")
+                log_success('Relay test completed successfully!')
+        else:
+            log_error(f"Test failed: {on_result['error']}")
     
     def cleanup(self):
         """Cleanup resources"""